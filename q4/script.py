@@ -38,6 +38,30 @@ from mininet.cli import CLI
 from mininet.log import setLogLevel, info
 from mininet.link import TCLink
 
+# Static banners printed by main(), kept as single strings so each is
+# written with one print call
+_HEADER = """\
+============================================================
+802.11 MAC PROTOCOL LOAD IMPACT EVALUATOR
+============================================================
+This tool evaluates how the 802.11 MAC layer handles
+traffic when multiple users are active simultaneously
+============================================================"""
+
+_FOOTER = """
+============================================================
+🎉 MAC LOAD EVALUATION COMPLETED!
+============================================================
+📋 Analysis covered:
+✓ Individual vs concurrent throughput comparison
+✓ MAC protocol efficiency under load
+✓ Fairness analysis using Jain's index
+✓ Delay and latency impact assessment
+✓ Performance degradation quantification
+
+📊 Check the generated visualization for detailed insights!
+============================================================"""
+
 class MAC802_11LoadEvaluator:
     def __init__(self):
         self.results = {}
@@ -739,8 +763,15 @@ MAC Protocol Behavior Under Load:
         print("• Consider 802.11n/ac for higher efficiency")
         print("• Implement proper channel management")
     
-    def run_evaluation(self):
-        """Run the complete MAC load evaluation"""
+    def run_evaluation(self, interactive=None):
+        """Run the complete MAC load evaluation
+        
+        The Mininet CLI is only opened when interactive is true; by default
+        this follows whether stdin is a terminal so headless runs don't block.
+        """
+        
+        if interactive is None:
+            interactive = sys.stdin.isatty()
         
         print("🚀 Starting 802.11 MAC Protocol Load Impact Evaluation")
         print("📡 Analyzing how MAC layer handles multiple concurrent users")
@@ -781,14 +812,15 @@ MAC Protocol Behavior Under Load:
             print(f"   • Average Delay: {delay:.1f} ms")
             print(f"   • Performance Loss: {100-efficiency:.1f}%")
             
-            print("\nPress Enter to open Mininet CLI for additional testing...")
-            print("Available commands:")
-            print("  sta1 iperf -c ap1 -t 10")
-            print("  sta2 ping -c 20 ap1")
-            print("  pingall")
-            input()
-            
-            CLI(self.net)
+            if interactive:
+                print("\nPress Enter to open Mininet CLI for additional testing...")
+                print("Available commands:")
+                print("  sta1 iperf -c ap1 -t 10")
+                print("  sta2 ping -c 20 ap1")
+                print("  pingall")
+                input()
+                
+                CLI(self.net)
             
         except KeyboardInterrupt:
             print("\n⚠️  Evaluation interrupted by user")
@@ -806,27 +838,12 @@ def main():
     """Main function"""
     setLogLevel('info')
     
-    print("="*60)
-    print("802.11 MAC PROTOCOL LOAD IMPACT EVALUATOR")
-    print("="*60)
-    print("This tool evaluates how the 802.11 MAC layer handles")
-    print("traffic when multiple users are active simultaneously")
-    print("="*60)
+    print(_HEADER)
     
     evaluator = MAC802_11LoadEvaluator()
     evaluator.run_evaluation()
     
-    print("\n" + "="*60)
-    print("🎉 MAC LOAD EVALUATION COMPLETED!")
-    print("="*60)
-    print("📋 Analysis covered:")
-    print("✓ Individual vs concurrent throughput comparison")
-    print("✓ MAC protocol efficiency under load")
-    print("✓ Fairness analysis using Jain's index")
-    print("✓ Delay and latency impact assessment")
-    print("✓ Performance degradation quantification")
-    print("\n📊 Check the generated visualization for detailed insights!")
-    print("="*60)
+    print(_FOOTER)
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
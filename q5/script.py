@@ -16,6 +16,16 @@ import time
 import subprocess
 import sys
 import random
+import re
+
+# Matches the received count in ping's summary line, e.g. "3 received"
+# or "3 packets received"
+_PING_RE = re.compile(r'(\d+)\s+(?:packets\s+)?received')
+
+def ping_ok(output, min_received=2):
+    """Return True if the ping summary reports at least min_received replies"""
+    m = _PING_RE.search(output)
+    return m is not None and int(m.group(1)) >= min_received
 
 def cleanup():
     """Clean up previous Mininet instances"""
@@ -76,13 +86,13 @@ def topology():
         # Check basic connectivity
         info("*** Testing connectivity\n")
         sta1_ping = sta1.cmd(f'ping -c 3 {server.IP()}')
-        if '3 received' in sta1_ping:
+        if ping_ok(sta1_ping):
             info("Sta1 connected to server: OK\n")
         else:
             error("Sta1 connection to server: FAILED\n")
             
         sta2_ping = sta2.cmd(f'ping -c 3 {server.IP()}')
-        if '3 received' in sta2_ping:
+        if ping_ok(sta2_ping):
             info("Sta2 connected to server: OK\n")
         else:
             error("Sta2 connection to server: FAILED\n")
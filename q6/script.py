@@ -16,13 +16,115 @@ import time
 import subprocess
 import sys
 import threading
+import signal
+import re
+
+import numpy as np
+
+# Timestamped (ping -D) reply and unanswered-probe (ping -O) lines, e.g.
+# "[1718000000.123456] 64 bytes from 10.0.0.1: icmp_seq=3 ttl=64 time=1.23 ms"
+# "[1718000001.123456] no answer yet for icmp_seq=4"
+_PING_REPLY_RE = re.compile(rb'^\[([\d.]+)\][^\n]*?time=([\d.]+)', re.M)
+_PING_MISS_RE = re.compile(rb'^\[([\d.]+)\] no answer yet', re.M)
+
+# Per-step ping samples and handover events recorded during the walk
+PING_SAMPLES_FILE = '/tmp/ping_samples.csv'
+HANDOVERS_FILE = '/tmp/handovers.csv'
+# Same data in binary form so analyze_results can skip parsing the CSVs
+RESULTS_NPZ = '/tmp/handover.npz'
+
+# Packet limit for the station's netem queues. The default of 1000 lets
+# backlogs build while rate/delay change every step, inflating measured RTT
+NETEM_LIMIT = 100
 
 def cleanup():
     """Clean up previous Mininet instances"""
     info("*** Cleaning up previous instances\n")
-    os.system('sudo mn -c > /dev/null 2>&1')
-    os.system('sudo pkill -f iperf > /dev/null 2>&1')
-    time.sleep(1)
+    # Run the tools directly rather than through a shell, adding sudo only
+    # when we are not already root; mn -c is synchronous so no settle time
+    sudo = [] if os.geteuid() == 0 else ['sudo']
+    subprocess.run(sudo + ['mn', '-c'], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    subprocess.run(sudo + ['pkill', '-f', 'iperf'], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+def tc_batch(node, commands):
+    """Start a single `tc -batch` process on a node for several tc commands
+    
+    The process is returned without waiting for it, so the caller can carry
+    on while tc applies the changes and reap it before the next update.
+    """
+    proc = node.popen(['tc', '-batch', '-'], stdin=subprocess.PIPE,
+                      stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    proc.stdin.write(''.join(f'{cmd}\n' for cmd in commands).encode())
+    proc.stdin.close()
+    return proc
+
+class PingStream:
+    """Long-running `ping -i` process on a node that logs straight to a file
+    
+    Nothing is parsed while the walk runs. Each line is timestamped (-D) and
+    unanswered probes are reported (-O), so the log is binned into movement
+    steps once the walk is over.
+    """
+    
+    def __init__(self, node, target, log_path, interval=1):
+        self.log_path = log_path
+        self.log = open(log_path, 'wb')
+        self.proc = node.popen(['ping', '-D', '-O', '-i', str(interval), target],
+                               stdout=self.log, stderr=subprocess.DEVNULL)
+    
+    def stop(self):
+        # SIGINT lets ping exit normally and flush its buffered output
+        self.proc.send_signal(signal.SIGINT)
+        self.proc.wait()
+        self.log.close()
+    
+    def step_stats(self, tick_ends):
+        """Return per-step (avg RTT ms, loss %) arrays for the given step end times
+        
+        Step i covers the lines logged after tick_ends[i-1] up to tick_ends[i].
+        The RTT is NaN for steps without any reply.
+        """
+        with open(self.log_path, 'rb') as f:
+            data = f.read()
+        replies = np.array(_PING_REPLY_RE.findall(data), dtype=float).reshape(-1, 2)
+        misses = np.array(_PING_MISS_RE.findall(data), dtype=float)
+        
+        steps = len(tick_ends)
+        reply_step = np.searchsorted(tick_ends, replies[:, 0])
+        miss_step = np.searchsorted(tick_ends, misses)
+        in_walk = reply_step < steps
+        received = np.bincount(reply_step[in_walk], minlength=steps)
+        rtt_sum = np.bincount(reply_step[in_walk], weights=replies[in_walk, 1], minlength=steps)
+        lost = np.bincount(miss_step[miss_step < steps], minlength=steps)
+        
+        with np.errstate(invalid='ignore', divide='ignore'):
+            rtts = rtt_sum / received
+            losses = np.where(received + lost > 0, lost / (received + lost) * 100.0, 100.0)
+        return rtts, losses
+
+def save_results(samples, handover_events):
+    """Write the recorded ping samples and handover events as CSV and .npz"""
+    samples = np.reshape(np.asarray(samples, dtype=float), (-1, 5))
+    handovers = np.reshape(np.asarray(handover_events, dtype=float), (-1, 3))
+    np.savetxt(PING_SAMPLES_FILE, samples, delimiter=',',
+               fmt=['%d', '%.2f', '%d', '%.3f', '%.1f'],
+               header='step,position,ap,rtt_ms,loss_pct')
+    np.savetxt(HANDOVERS_FILE, handovers, delimiter=',',
+               fmt=['%d', '%.2f', '%d'], header='step,position,to_ap')
+    np.savez(RESULTS_NPZ, samples=samples, handovers=handovers)
+
+def load_results():
+    """Return (samples, handovers) arrays, preferring the .npz over the CSVs"""
+    if os.path.exists(RESULTS_NPZ):
+        with np.load(RESULTS_NPZ) as data:
+            return data['samples'], data['handovers']
+    
+    samples = np.loadtxt(PING_SAMPLES_FILE, delimiter=',', ndmin=2).reshape(-1, 5)
+    if os.path.exists(HANDOVERS_FILE):
+        handovers = np.loadtxt(HANDOVERS_FILE, delimiter=',', ndmin=2).reshape(-1, 3)
+    else:
+        handovers = np.empty((0, 3))
+    return samples, handovers
 
 def adjust_link_quality(net, sta, ap1, ap2, step_count=20):
     """Simulate movement by gradually changing link quality"""
@@ -38,104 +140,116 @@ def adjust_link_quality(net, sta, ap1, ap2, step_count=20):
     # Create TCLink connections to both APs
     # Start with good connection to AP1, poor connection to AP2
     link1 = net.addLink(sta, ap1, cls=TCLink, bw=ap1_quality['bw'], 
-                       delay=ap1_quality['delay'], loss=ap1_quality['loss'])
+                       delay=ap1_quality['delay'], loss=ap1_quality['loss'],
+                       max_queue_size=NETEM_LIMIT)
     link2 = net.addLink(sta, ap2, cls=TCLink, bw=ap2_quality['bw'], 
-                       delay=ap2_quality['delay'], loss=ap2_quality['loss'])
+                       delay=ap2_quality['delay'], loss=ap2_quality['loss'],
+                       max_queue_size=NETEM_LIMIT)
+    
+    # Look up the AP addresses once; IP() is not free to call inside the walk
+    ap1_ip, ap2_ip = ap1.IP(), ap2.IP()
     
     # Set up initial routing to use AP1
-    sta.cmd(f'ip route add default via {ap1.IP()}')
+    sta.cmd(f'ip route replace default via {ap1_ip}')
     
-    # Open the ping output file for writing
-    with open('/tmp/ping_output.txt', 'w') as f:
-        f.write("*** Ping results during simulated movement ***\n")
-        f.write("Time | Position | Connected AP | RTT (ms) | Packet Loss\n")
-        f.write("---------------------------------------------------------\n")
-        
+    # Precompute link quality along the whole walk from AP1 (0.0) to AP2 (1.0)
+    # As sta moves from AP1 to AP2, quality of AP1 link decreases and AP2 improves
+    positions = np.linspace(0.0, 1.0, step_count + 1)
+    ap1_bw = np.maximum(1, 20 - positions * 19)  # 20 down to 1
+    ap1_delay = 1 + positions * 19  # 1ms up to 20ms
+    ap1_loss = np.minimum(99, positions * 50)  # 0% up to 50%
+    
+    ap2_bw = np.maximum(1, 1 + positions * 19)  # 1 up to 20
+    ap2_delay = 20 - positions * 19  # 20ms down to 1ms
+    ap2_loss = np.minimum(99, 50 - positions * 50)  # 50% down to 0%
+    
+    # Handover should occur wherever AP2 is better than AP1
+    use_ap2 = (ap2_bw > ap1_bw) & (ap2_loss < ap1_loss)
+    
+    # Quantize to whole Mbit/ms/% so steps that round to the same values as
+    # the previous one don't reconfigure the qdisc
+    ap1_params = np.rint(np.column_stack((ap1_bw, ap1_delay, ap1_loss))).astype(int)
+    ap2_params = np.rint(np.column_stack((ap2_bw, ap2_delay, ap2_loss))).astype(int)
+    
+    # Build every step's tc command up front so the loop only indexes them
+    link1_name = f"{sta.name}-eth0"
+    link2_name = f"{sta.name}-eth1"
+    cmds1 = [f'qdisc replace dev {link1_name} root netem rate {bw}Mbit delay {delay}ms loss {loss}% limit {NETEM_LIMIT}'
+             for bw, delay, loss in ap1_params]
+    cmds2 = [f'qdisc replace dev {link2_name} root netem rate {bw}Mbit delay {delay}ms loss {loss}% limit {NETEM_LIMIT}'
+             for bw, delay, loss in ap2_params]
+    
+    # Rows are kept in memory and only formatted when the walk ends
+    handover_events = []
+    connected = []
+    tick_ends = []
+    
+    # Keep one ping running towards each AP for the whole walk instead of
+    # forking a new ping every step; only the connected AP's log is used.
+    # Probe several times per 1 s step so no step is left without replies
+    streams = {1: PingStream(sta, ap1_ip, '/tmp/ping_ap1.log', interval=0.2),
+               2: PingStream(sta, ap2_ip, '/tmp/ping_ap2.log', interval=0.2)}
+    
+    pending_tc = None
+    try:
         # Start the movement simulation
+        next_step = time.monotonic()
         for step in range(step_count + 1):
-            position = step / step_count  # 0.0 to 1.0 representing position
-            
-            # Calculate new link qualities based on position
-            # As sta moves from AP1 to AP2, quality of AP1 link decreases and AP2 improves
-            ap1_new_bw = max(1, 20 - position * 19)  # 20 down to 1
-            ap1_new_delay = f"{1 + position * 19}ms"  # 1ms up to 20ms
-            ap1_new_loss = min(99, position * 50)  # 0% up to 50%
-            
-            ap2_new_bw = max(1, 1 + position * 19)  # 1 up to 20
-            ap2_new_delay = f"{20 - position * 19}ms"  # 20ms down to 1ms
-            ap2_new_loss = min(99, 50 - position * 50)  # 50% down to 0%
+            position = positions[step]
             
-            # Update link qualities to simulate movement
-            link1_name = f"{sta.name}-eth0"
-            link2_name = f"{sta.name}-eth1"
+            # Update whichever of the AP1/AP2 links changed in one tc invocation
+            commands = [cmds[step] for cmds in (cmds1, cmds2)
+                        if step == 0 or cmds[step] != cmds[step - 1]]
+            if commands:
+                # Both links are updated concurrently with the route change
+                # below; only the previous step's update must have finished
+                if pending_tc:
+                    pending_tc.wait()
+                pending_tc = tc_batch(sta, commands)
             
-            # Update AP1 link quality
-            sta.cmd(f'tc qdisc change dev {link1_name} root netem rate {ap1_new_bw}Mbit delay {ap1_new_delay} loss {ap1_new_loss}%')
-            # Update AP2 link quality
-            sta.cmd(f'tc qdisc change dev {link2_name} root netem rate {ap2_new_bw}Mbit delay {ap2_new_delay} loss {ap2_new_loss}%')
-            
-            # Determine if handover should occur (when AP2 becomes better than AP1)
-            should_use_ap2 = (ap2_new_bw > ap1_new_bw and ap2_new_loss < ap1_new_loss)
+            should_use_ap2 = use_ap2[step]
             
             # If we need to change APs, simulate a handover
             if should_use_ap2 and current_link == 1:
                 info(f"*** Handover at position {position:.2f}: STA changing from AP1 to AP2\n")
-                # Change default route to use AP2
-                sta.cmd(f'ip route del default')
-                sta.cmd(f'ip route add default via {ap2.IP()}')
+                # Atomically switch the default route to AP2
+                sta.cmd(f'ip route replace default via {ap2_ip}')
                 current_link = 2
                 
                 # Record the handover event
-                f.write(f"{step} | {position:.2f} | Handover to AP2 | - | -\n")
+                handover_events.append((step, position, 2))
                 
             elif not should_use_ap2 and current_link == 2:
                 info(f"*** Handover at position {position:.2f}: STA changing from AP2 to AP1\n")
-                # Change default route to use AP1
-                sta.cmd(f'ip route del default')
-                sta.cmd(f'ip route add default via {ap1.IP()}')
+                # Atomically switch the default route to AP1
+                sta.cmd(f'ip route replace default via {ap1_ip}')
                 current_link = 1
                 
                 # Record the handover event
-                f.write(f"{step} | {position:.2f} | Handover to AP1 | - | -\n")
-            
-            # Run a ping test to the Internet (simulated by a server node)
-            if current_link == 1:
-                ping_target = ap1.IP()
-                connected_ap = "AP1"
-            else:
-                ping_target = ap2.IP()
-                connected_ap = "AP2"
-                
-            # Run ping and extract RTT and loss
-            ping_result = sta.cmd(f'ping -c 3 -q {ping_target}')
-            
-            # Parse ping results
-            rtt = "timeout"
-            loss = 100.0
+                handover_events.append((step, position, 1))
             
-            for line in ping_result.split('\n'):
-                if 'min/avg/max' in line:
-                    try:
-                        rtt = line.split('=')[1].split('/')[1].strip()
-                    except:
-                        pass
-                if 'packets transmitted' in line:
-                    try:
-                        packets_sent = int(line.split(' ')[0])
-                        packets_received = int(line.split(' ')[3])
-                        if packets_sent > 0:
-                            loss = 100.0 - (packets_received / packets_sent * 100.0)
-                    except:
-                        pass
+            # Hold each position for a 1 s tick, paced against a fixed
+            # schedule so time spent on tc and route updates overlaps pinging
+            next_step += 1
+            time.sleep(max(0, next_step - time.monotonic()))
             
-            # Record the ping result
-            f.write(f"{step} | {position:.2f} | {connected_ap} | {rtt} | {loss:.1f}%\n")
-            
-            # Sleep to simulate real-time movement
-            time.sleep(1)
+            # Mark where this step's ping window ends on ping's wall clock
+            connected.append(current_link)
+            tick_ends.append(time.time())
+    finally:
+        if pending_tc:
+            pending_tc.wait()
+        for stream in streams.values():
+            stream.stop()
+        
+        # Attribute each step to the replies logged by its connected AP
+        stats = {link: stream.step_stats(tick_ends) for link, stream in streams.items()}
+        samples = [(step, positions[step], link, stats[link][0][step], stats[link][1][step])
+                   for step, link in enumerate(connected)]
+        save_results(samples, handover_events)
     
     info("*** Movement simulation completed\n")
-    info("*** Check /tmp/ping_output.txt for detailed results\n")
+    info(f"*** Check {PING_SAMPLES_FILE} and {HANDOVERS_FILE} for detailed results\n")
 
 def topology():
     """Create a simple network to simulate a station moving between APs"""
@@ -196,9 +310,11 @@ def topology():
         info("*** Setting up mobility simulation\n")
         adjust_link_quality(net, sta, ap1, ap2)
         
-        # Start CLI for network exploration
-        info("\n*** Starting CLI for network exploration (type 'exit' when done)\n")
-        CLI(net)
+        # Start CLI for network exploration; MININET_CLI=0 skips it so
+        # scripted runs go straight on to analyze_results()
+        if os.environ.get('MININET_CLI', '1') == '1':
+            info("\n*** Starting CLI for network exploration (type 'exit' when done)\n")
+            CLI(net)
         
     except Exception as e:
         error(f"*** Error: {e}\n")
@@ -214,45 +330,20 @@ def analyze_results():
     """Analyze and visualize the handover results"""
     try:
         # Check if the results file exists
-        if not os.path.exists('/tmp/ping_output.txt'):
-            error("*** Results file '/tmp/ping_output.txt' not found\n")
+        if not os.path.exists(RESULTS_NPZ) and not os.path.exists(PING_SAMPLES_FILE):
+            error(f"*** Results file '{PING_SAMPLES_FILE}' not found\n")
             return
             
         # Process the results
         info("*** Analyzing handover results\n")
-        with open('/tmp/ping_output.txt', 'r') as f:
-            lines = f.readlines()[3:]  # Skip header lines
-            
-        positions = []
-        rtts = []
-        losses = []
-        handovers = []
+        samples, handover_rows = load_results()
         
-        for line in lines:
-            parts = line.strip().split('|')
-            if len(parts) >= 5:
-                try:
-                    position = float(parts[1].strip())
-                    positions.append(position)
-                    
-                    # Check if this is a handover line
-                    if "Handover" in parts[2]:
-                        handovers.append(position)
-                        rtts.append(None)
-                        losses.append(None)
-                    else:
-                        # Try to parse RTT
-                        rtt_str = parts[3].strip()
-                        if rtt_str == "timeout":
-                            rtts.append(1000)  # Use 1000ms for timeouts
-                        else:
-                            rtts.append(float(rtt_str))
-                            
-                        # Parse loss
-                        loss_str = parts[4].strip().replace('%', '')
-                        losses.append(float(loss_str))
-                except Exception as e:
-                    error(f"Error parsing line: {line.strip()}, Error: {e}\n")
+        steps = samples[:, 0]
+        positions = samples[:, 1]
+        rtts = np.where(np.isnan(samples[:, 3]), 1000, samples[:, 3])  # Use 1000ms for timeouts
+        losses = samples[:, 4]
+        handover_steps = handover_rows[:, 0]
+        handovers = handover_rows[:, 1]
         
         # Generate a simple text-based visualization
         info("\n*** Handover Analysis Results ***\n")
@@ -260,68 +351,59 @@ def analyze_results():
         info("------------------------------------------\n")
         
         for i, pos in enumerate(positions):
-            if i < len(rtts) and rtts[i] is None:  # Handover point
+            if steps[i] in handover_steps:  # Handover point
                 info(f"{pos:.2f}    | -------- | ---------- | *** HANDOVER ***\n")
-            elif i < len(rtts) and i < len(losses):
-                status = "GOOD" if rtts[i] < 100 and losses[i] < 10 else "POOR"
-                info(f"{pos:.2f}    | {rtts[i]:.1f}     | {losses[i]:.1f}%       | {status}\n")
+            status = "GOOD" if rtts[i] < 100 and losses[i] < 10 else "POOR"
+            info(f"{pos:.2f}    | {rtts[i]:.1f}     | {losses[i]:.1f}%       | {status}\n")
         
         # Try to create a plot if matplotlib is available
         try:
-            import matplotlib
-            matplotlib.use('Agg')  # Use non-interactive backend
-            import matplotlib.pyplot as plt
-            import numpy as np
-            
-            # Create positions for plotting, filtering out handover points
-            plot_positions = []
-            plot_rtts = []
-            plot_losses = []
+            # Draw on a bare Figure, which savefig renders with Agg; nothing is
+            # shown on screen, so pyplot's global figure manager is not needed
+            from matplotlib.figure import Figure
             
-            for i, pos in enumerate(positions):
-                if i < len(rtts) and rtts[i] is not None:
-                    plot_positions.append(pos)
-                    plot_rtts.append(min(rtts[i], 500))  # Cap RTT at 500ms for visibility
-                    plot_losses.append(losses[i])
-            
-            # Create a figure with two subplots
-            plt.figure(figsize=(10, 8))
+            plot_positions = positions
+            plot_rtts = np.minimum(rtts, 500)  # Cap RTT at 500ms for visibility
+            plot_losses = losses
             
             # Ensure we have data to plot
             if len(plot_positions) > 0 and len(plot_rtts) > 0:
+                # Create a figure with two subplots
+                fig = Figure(figsize=(10, 8))
+                ax_rtt, ax_loss = fig.subplots(2, 1)
+                
                 # RTT subplot
-                plt.subplot(2, 1, 1)
-                plt.plot(plot_positions, plot_rtts, 'b-o', linewidth=2)
+                ax_rtt.plot(plot_positions, plot_rtts, 'b-o', linewidth=2)
                 
                 # Mark handover points with vertical lines
                 for h_pos in handovers:
-                    plt.axvline(x=h_pos, color='r', linestyle='--', alpha=0.7)
+                    ax_rtt.axvline(x=h_pos, color='r', linestyle='--', alpha=0.7)
                     if len(plot_rtts) > 0:  # Ensure there are RTT values
-                        plt.text(h_pos, max(plot_rtts)/2, 'Handover', rotation=90, 
-                                verticalalignment='center')
+                        ax_rtt.text(h_pos, max(plot_rtts)/2, 'Handover', rotation=90, 
+                                    verticalalignment='center')
                 
-                plt.title('RTT vs. Position during Handover Simulation', fontsize=14)
-                plt.ylabel('RTT (ms)', fontsize=12)
-                plt.grid(True, alpha=0.3)
+                ax_rtt.set_title('RTT vs. Position during Handover Simulation', fontsize=14)
+                ax_rtt.set_ylabel('RTT (ms)', fontsize=12)
+                ax_rtt.grid(True, alpha=0.3)
                 
                 # Packet loss subplot
-                plt.subplot(2, 1, 2)
-                plt.plot(plot_positions, plot_losses, 'g-o', linewidth=2)
+                ax_loss.plot(plot_positions, plot_losses, 'g-o', linewidth=2)
                 
                 # Mark handover points with vertical lines
                 for h_pos in handovers:
-                    plt.axvline(x=h_pos, color='r', linestyle='--', alpha=0.7)
+                    ax_loss.axvline(x=h_pos, color='r', linestyle='--', alpha=0.7)
                     if len(plot_losses) > 0:  # Ensure there are loss values
-                        plt.text(h_pos, max(plot_losses)/2, 'Handover', rotation=90, 
-                                verticalalignment='center')
+                        ax_loss.text(h_pos, max(plot_losses)/2, 'Handover', rotation=90, 
+                                     verticalalignment='center')
                 
-                plt.title('Packet Loss vs. Position during Handover Simulation', fontsize=14)
-                plt.xlabel('Position (0.0 = near AP1, 1.0 = near AP2)', fontsize=12)
-                plt.ylabel('Packet Loss (%)', fontsize=12)
-                plt.grid(True, alpha=0.3)
+                ax_loss.set_title('Packet Loss vs. Position during Handover Simulation', fontsize=14)
+                ax_loss.set_xlabel('Position (0.0 = near AP1, 1.0 = near AP2)', fontsize=12)
+                ax_loss.set_ylabel('Packet Loss (%)', fontsize=12)
+                ax_loss.grid(True, alpha=0.3)
                 
-                plt.tight_layout()
-                plt.savefig('./handover_analysis.png', dpi=300)
+                fig.tight_layout()
+                # 100 dpi is plenty for a 10x8in analysis plot; PLOT_DPI raises it
+                fig.savefig('./handover_analysis.png', dpi=int(os.environ.get('PLOT_DPI', '100')))
                 info("\n*** Created visualization: ./handover_analysis.png\n")
             else:
                 error("*** Not enough data points to create a plot\n")
@@ -0,0 +1,32 @@
+#!/usr/bin/env python
+
+"""
+Ping output parser shared by script.py and script2.py
+"""
+
+import re
+import numpy as np
+
+# A reply ("icmp_seq=N ... time=X ms", capturing the RTT) or a lost-packet
+# line ("icmp_seq=N ... Destination Host Unreachable")
+PING_EVENT_RE = re.compile(rb'icmp_seq=(\d+)[^\n]*?(?:time=([\d.]+)|Destination Host Unreachable|Request timed out)')
+
+def parse_ping_bytes(buf):
+    """Parse raw ping output (bytes or mmap) in a single regex scan
+
+    Returns three NumPy arrays: the sequence numbers and RTTs (ms) of the
+    replies, and the sequence numbers of the lost packets.
+    """
+    seqs = []
+    times = []
+    lost_seqs = []
+
+    for match in PING_EVENT_RE.finditer(buf):
+        if match.group(2):
+            seqs.append(int(match.group(1)))
+            times.append(float(match.group(2)))
+        else:
+            lost_seqs.append(int(match.group(1)))
+
+    return (np.array(seqs, dtype=int), np.array(times, dtype=float),
+            np.array(lost_seqs, dtype=int))
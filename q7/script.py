@@ -15,7 +15,11 @@ import os
 import time
 import threading
 import subprocess
-import random
+import mmap
+
+import numpy as np
+
+from ping_parser import parse_ping_bytes
 
 def cleanup():
     """Clean up previous Mininet instances"""
@@ -25,102 +29,95 @@ def cleanup():
     time.sleep(1)
 
 def generate_synthetic_ping_data(duration=20):
-    """Generate synthetic ping data for visualization if real data isn't available"""
+    """Generate synthetic ping data for visualization if real data isn't available
+    
+    The data is written to ./ping_output.txt and also returned as bytes.
+    """
     info("*** Generating synthetic ping data for visualization\n")
     
     # We'll create data for the entire duration with 5 pings per second
     num_pings = duration * 5
     
-    # Create synthetic ping data with realistic patterns
-    with open('./ping_output.txt', 'w') as f:
-        f.write("PING synthetic.data (10.0.0.2): 56 data bytes\n")
-        
-        # Generate ping data that shows performance changes during mobility
-        for i in range(num_pings):
-            # Convert ping number to position (0.0 to 1.0)
-            position = i / num_pings
-            
-            # Determine if this should be a lost packet
-            # Higher probability of loss during handover (around position 0.5)
-            loss_probability = 0.01  # 1% base loss rate
-            if 0.48 < position < 0.55:
-                loss_probability = 0.8  # 80% loss during handover
-            
-            # Determine ping time based on position
-            # - Low near AP1 (position 0.0)
-            # - High in the middle (position 0.5)
-            # - Low near AP2 (position 1.0)
-            base_ping = 20  # Base ping time in ms
-            
-            # Add curve that peaks in the middle (quadratic function)
-            position_factor = 4 * (position - 0.5)**2  # 0.0 to 1.0 curve
-            distance_penalty = 180 * (1 - position_factor)  # Higher in middle
-            
-            # Add some randomness
-            jitter = random.uniform(-5, 5)
-            
-            ping_time = base_ping + distance_penalty + jitter
-            
-            # Decide if packet is lost
-            if random.random() < loss_probability:
-                f.write("From 10.0.0.1 icmp_seq={} Destination Host Unreachable\n".format(i+1))
-            else:
-                f.write("64 bytes from 10.0.0.2: icmp_seq={} ttl=64 time={:.3f} ms\n".format(
-                    i+1, ping_time))
-        
-        # Add summary
-        f.write("\n--- 10.0.0.2 ping statistics ---\n")
-        delivered = int(num_pings * 0.85)  # Assume 85% delivery
-        f.write("{} packets transmitted, {} received, {:.1f}% packet loss\n".format(
-            num_pings, delivered, 100 - (delivered/num_pings*100)))
-        f.write("rtt min/avg/max/mdev = 15.323/45.832/198.521/32.421 ms\n")
-    
-    return True
+    # Generate ping data that shows performance changes during mobility,
+    # drawing every ping's jitter and loss at once
+    rng = np.random.default_rng()
+    seqs = np.arange(1, num_pings + 1)
+    
+    # Convert ping number to position (0.0 to 1.0)
+    position = (seqs - 1) / num_pings
+    
+    # Determine if this should be a lost packet
+    # Higher probability of loss during handover (around position 0.5)
+    # 1% base loss rate, 80% loss during handover
+    loss_probability = np.where((position > 0.48) & (position < 0.55), 0.8, 0.01)
+    lost = rng.random(num_pings) < loss_probability
+    
+    # Determine ping time based on position
+    # - Low near AP1 (position 0.0)
+    # - High in the middle (position 0.5)
+    # - Low near AP2 (position 1.0)
+    base_ping = 20  # Base ping time in ms
+    
+    # Add curve that peaks in the middle (quadratic function)
+    position_factor = 4 * (position - 0.5)**2  # 0.0 to 1.0 curve
+    distance_penalty = 180 * (1 - position_factor)  # Higher in middle
+    
+    # Add some randomness
+    jitter = rng.uniform(-5, 5, num_pings)
+    
+    ping_time = base_ping + distance_penalty + jitter
+    
+    lines = [
+        "From 10.0.0.1 icmp_seq={} Destination Host Unreachable\n".format(seq) if is_lost
+        else "64 bytes from 10.0.0.2: icmp_seq={} ttl=64 time={:.3f} ms\n".format(seq, rtt)
+        for seq, rtt, is_lost in zip(seqs.tolist(), ping_time.tolist(), lost.tolist())
+    ]
+    
+    # Create synthetic ping data with realistic patterns, assembled in one
+    # buffer so the whole file goes out in a single write
+    buf = bytearray(b"PING synthetic.data (10.0.0.2): 56 data bytes\n")
+    buf += ''.join(lines).encode()
+    
+    # Add summary
+    delivered = int(num_pings * 0.85)  # Assume 85% delivery
+    buf += ("\n--- 10.0.0.2 ping statistics ---\n"
+            "{} packets transmitted, {} received, {:.1f}% packet loss\n"
+            "rtt min/avg/max/mdev = 15.323/45.832/198.521/32.421 ms\n").format(
+                num_pings, delivered, 100 - (delivered/num_pings*100)).encode()
+    
+    with open('./ping_output.txt', 'wb') as f:
+        f.write(buf)
+    
+    return bytes(buf)
 
 def analyze_results():
     """Analyze ping results to evaluate mobility impact"""
     info("*** Analyzing results\n")
     
     try:
-        # Check if the ping output file exists and has valid data
-        has_valid_data = False
+        # Check if the ping output file exists and has valid data, mapping
+        # it once so the check and the parse share the same pages
+        content = None
         
-        if os.path.exists('./ping_output.txt'):
-            with open('./ping_output.txt', 'r') as f:
-                content = f.read()
-                if 'bytes from' in content and len(content.strip()) > 10:
-                    has_valid_data = True
+        if os.path.exists('./ping_output.txt') and os.path.getsize('./ping_output.txt') > 10:
+            with open('./ping_output.txt', 'rb') as f:
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            if mapped.find(b'bytes from') != -1:
+                content = mapped
+            else:
+                mapped.close()
         
-        # If no valid data, generate synthetic data
-        if not has_valid_data:
+        # If no valid data, generate synthetic data and use it directly
+        if content is None:
             info("*** No valid ping data found, generating synthetic data\n")
-            generate_synthetic_ping_data()
-            
-            # Read the newly generated data
-            with open('./ping_output.txt', 'r') as f:
-                content = f.read()
-        
-        # Parse ping output
-        ping_times = []
-        lost_packets = []
-        seq_counter = 0
+            content = generate_synthetic_ping_data()
         
-        for line in content.split('\n'):
-            if 'bytes from' in line and 'time=' in line:
-                # Extract ping time
-                seq_counter += 1
-                parts = line.split('time=')
-                if len(parts) >= 2:
-                    try:
-                        time_part = parts[1].split()[0]
-                        if 'ms' in time_part:
-                            ping_times.append(float(time_part.replace('ms', '')))
-                    except:
-                        pass
-            elif 'Destination Host Unreachable' in line or 'Request timed out' in line:
-                # Mark packet loss with a high value
-                seq_counter += 1
-                lost_packets.append(seq_counter)
+        # Parse ping output with the shared single-scan parser
+        seqs, rtts, lost_seqs = parse_ping_bytes(content)
+        ping_times = rtts.tolist()
+        lost_packets = lost_seqs.tolist()
+        if isinstance(content, mmap.mmap):
+            content.close()
         
         # Create a report
         info("\n*** Connectivity Report ***\n")
@@ -160,42 +157,39 @@ def analyze_results():
             import matplotlib
             matplotlib.use('Agg')  # Use non-interactive backend
             import matplotlib.pyplot as plt
-            import numpy as np
             
-            # Create x-axis (sequence numbers)
-            x = list(range(1, len(ping_times) + len(lost_packets) + 1))
+            # Let Agg merge near-collinear segments and draw long traces in chunks
+            matplotlib.rcParams.update({'path.simplify': True,
+                                        'path.simplify_threshold': 1.0,
+                                        'agg.path.chunksize': 10000})
             
-            # Create y-values with packet loss marked as None
-            y = []
-            lost_indices = set(lost_packets)
-            ping_index = 0
+            # Create x-axis (sequence numbers) covering every reply and loss
+            num_seqs = int(max(seqs.max(initial=0), lost_seqs.max(initial=0)))
+            x = np.arange(1, num_seqs + 1)
             
-            for i in range(1, len(x) + 1):
-                if i in lost_indices:
-                    y.append(None)  # Mark lost packets
-                else:
-                    if ping_index < len(ping_times):
-                        y.append(ping_times[ping_index])
-                        ping_index += 1
-                    else:
-                        y.append(None)
+            # Create y-values by placing each RTT at its sequence number;
+            # lost packets (and any other unanswered ones) stay NaN
+            y = np.full(num_seqs, np.nan)
+            y[seqs - 1] = rtts
             
-            # Create the plot
-            plt.figure(figsize=(12, 6))
+            # Create the plot; constrained layout is solved during the save
+            # itself rather than by a separate tight_layout pass, with the
+            # bottom strip kept clear for the annotation
+            fig, ax = plt.subplots(figsize=(12, 6), layout='constrained')
+            fig.get_layout_engine().set(rect=(0, 0.08, 1, 0.92))
             
-            # Plot ping times
-            valid_indices = [i for i, val in enumerate(y) if val is not None]
-            valid_x = [x[i] for i in valid_indices]
-            valid_y = [y[i] for i in valid_indices]
+            # Plot ping times; one mask splits replies from lost packets
+            is_lost = np.isnan(y)
+            valid_x = x[~is_lost]
+            valid_y = y[~is_lost]
             
-            if valid_y:  # Only plot if we have valid data
+            if valid_y.size:  # Only plot if we have valid data
                 plt.plot(valid_x, valid_y, 'b-', label='Ping Time')
                 
                 # Mark lost packets
-                lost_indices = [i for i, val in enumerate(y) if val is None]
-                lost_x = [x[i] for i in lost_indices]
-                if lost_x and valid_y:
-                    plt.scatter(lost_x, [max(valid_y) * 1.1] * len(lost_x), color='red', marker='x', s=100, label='Packet Loss')
+                lost_x = x[is_lost]
+                if lost_x.size:
+                    plt.scatter(lost_x, np.full(lost_x.size, valid_y.max() * 1.1), color='red', marker='x', s=100, label='Packet Loss')
                 
                 # Read handover events
                 handover_times = []
@@ -205,29 +199,26 @@ def analyze_results():
                         next(f)
                         next(f)
                         for line in f:
-                            parts = line.split('|')
-                            if len(parts) >= 2:
+                            time_field, sep, _ = line.partition('|')
+                            if sep:
                                 try:
-                                    time_sec = float(parts[0].strip())
+                                    time_sec = float(time_field)
                                     # Convert time to packet number (approximately)
                                     packet_num = int(time_sec * 5)  # 5 pings per second
                                     handover_times.append(packet_num)
                                 except:
                                     pass
                 
-                # Mark handover events
-                handovers_added = set()  # Track which handovers we've added (for legend)
-                for h_time in handover_times:
-                    if 1 <= h_time <= len(x):
-                        if 'Handover' not in handovers_added:
-                            plt.axvline(x=h_time, color='green', linestyle='--', linewidth=2, label='Handover')
-                            handovers_added.add('Handover')
-                        else:
-                            plt.axvline(x=h_time, color='green', linestyle='--', linewidth=2)
-                        
-                        # Only add text if there's room
-                        if len(valid_y) > 10:
-                            plt.text(h_time, max(valid_y) * 0.5, 'Handover', rotation=90, verticalalignment='center')
+                # Mark handover events, all as one full-height line collection
+                shown = [h_time for h_time in handover_times if 1 <= h_time <= len(x)]
+                if shown:
+                    ax.vlines(shown, 0, 1, transform=ax.get_xaxis_transform(),
+                              colors='green', linestyles='--', linewidths=2, label='Handover')
+                    
+                    # Only add text if there's room
+                    if len(valid_y) > 10:
+                        for h_time in shown:
+                            plt.text(h_time, valid_y.max() * 0.5, 'Handover', rotation=90, verticalalignment='center')
                 
                 plt.title('Ping Times During Station Movement', fontsize=14)
                 plt.xlabel('Ping Sequence Number', fontsize=12)
@@ -245,8 +236,7 @@ def analyze_results():
                 by_label = dict(zip(labels, handles))
                 plt.legend(by_label.values(), by_label.keys(), loc='upper right')
                 
-                plt.tight_layout(rect=[0, 0.03, 1, 0.95])
-                plt.savefig('./mobility_results.png', dpi=300)
+                fig.savefig('./mobility_results.png', dpi=150, pil_kwargs={'compress_level': 1})
                 info("\n*** Created visualization: ./mobility_results.png\n")
             else:
                 error("*** Not enough data to create visualization\n")
@@ -363,69 +353,90 @@ def simulate_mobility(net, sta1, ap1, ap2, duration=20):
     else:
         sta1_intf2 = link2.intf2.name
     
+    # One long-lived tc reads all qdisc updates from stdin instead of a
+    # shell and tc process per update; -force keeps it going past errors
+    tc_proc = sta1.popen(['tc', '-force', '-batch', '-'], stdin=subprocess.PIPE,
+                         stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    
     # Set initial link qualities - start near AP1, far from AP2
     # Good connection to AP1, poor connection to AP2
-    sta1.cmd(f'tc qdisc change dev {sta1_intf1} root netem rate 20Mbit delay 2ms loss 1%')
-    sta1.cmd(f'tc qdisc change dev {sta1_intf2} root netem rate 1Mbit delay 20ms loss 50%')
+    tc_proc.stdin.write(f'qdisc change dev {sta1_intf1} root netem rate 20Mbit delay 2ms loss 1%\n'
+                        f'qdisc change dev {sta1_intf2} root netem rate 1Mbit delay 20ms loss 50%\n'.encode())
+    tc_proc.stdin.flush()
     
-    # Set up initial routing to use AP1
+    # Set up initial routing to use AP1, tracking the choice here rather than
+    # asking the station for its default route every step
     sta1.cmd(f'ip route add default via {ap1.IP()}')
+    current_ap = ap1
     
-    # Create file to track handovers
-    with open('./handover_events.txt', 'w') as f:
-        f.write("Time(s) | Position | Event\n")
-        f.write("--------------------------\n")
+    # Create file to track handovers, kept open for the whole simulation
+    handover_log = open('./handover_events.txt', 'w', buffering=1 << 16)
+    handover_log.write("Time(s) | Position | Event\n")
+    handover_log.write("--------------------------\n")
     
     # Prepare for ping output
     h1 = net.get('h1')
     sta1.cmd(f'ping -c 1 {h1.IP()} > /dev/null 2>&1')  # Warm up ping
-    sta1.cmd(f'ping -i 0.2 -c {duration*5} {h1.IP()} > ./ping_output.txt &')
+    # Line-buffer ping so every reply reaches the log as it arrives instead
+    # of sitting in stdio's block buffer until ping exits
+    sta1.cmd(f'stdbuf -oL ping -i 0.2 -c {duration*5} {h1.IP()} > ./ping_output.txt &')
+    
+    # The path is fixed by duration, so work out every step's link
+    # qualities and tc commands up front
+    # As position increases (station moves right):
+    # - AP1 link gets worse
+    # - AP2 link gets better
+    positions = np.arange(duration + 1) / duration      # 0.0 to 1.0
+    ap1_bw = np.maximum(1, 20 - positions * 19)         # 20 Mbps down to 1 Mbps
+    ap1_delay = 2 + positions * 18                      # 2ms up to 20ms
+    ap1_loss = np.minimum(80, positions * 50)           # 0% up to 50%
+    
+    ap2_bw = np.maximum(1, 1 + positions * 19)          # 1 Mbps up to 20 Mbps
+    ap2_delay = 20 - positions * 18                     # 20ms down to 2ms
+    ap2_loss = np.minimum(80, 50 - positions * 50)      # 50% down to 0%
+    
+    steps = list(zip(positions.tolist(), ap1_loss.tolist(), ap2_loss.tolist()))
+    tc_cmds = [
+        (f'qdisc change dev {sta1_intf1} root netem rate {bw1}Mbit delay {d1}ms loss {l1}%\n'
+         f'qdisc change dev {sta1_intf2} root netem rate {bw2}Mbit delay {d2}ms loss {l2}%\n').encode()
+        for bw1, d1, l1, bw2, d2, l2 in zip(ap1_bw.tolist(), ap1_delay.tolist(), ap1_loss.tolist(),
+                                            ap2_bw.tolist(), ap2_delay.tolist(), ap2_loss.tolist())
+    ]
     
     # Simulate movement by gradually changing link quality
     start_time = time.time()
     info("*** Starting station movement simulation\n")
     
     try:
-        for step in range(duration + 1):
-            # Calculate position (0.0 to 1.0)
-            position = step / duration
-            
-            # Update link qualities based on position
-            # As position increases (station moves right):
-            # - AP1 link gets worse
-            # - AP2 link gets better
-            ap1_bw = max(1, 20 - position * 19)  # 20 Mbps down to 1 Mbps
-            ap1_delay = f"{2 + position * 18}ms"  # 2ms up to 20ms
-            ap1_loss = min(80, position * 50)     # 0% up to 50%
-            
-            ap2_bw = max(1, 1 + position * 19)    # 1 Mbps up to 20 Mbps
-            ap2_delay = f"{20 - position * 18}ms" # 20ms down to 2ms
-            ap2_loss = min(80, 50 - position * 50) # 50% down to 0%
-            
+        for step, (position, loss1, loss2) in enumerate(steps):
             # Update TC rules to reflect new link qualities
-            sta1.cmd(f'tc qdisc change dev {sta1_intf1} root netem rate {ap1_bw}Mbit delay {ap1_delay} loss {ap1_loss}%')
-            sta1.cmd(f'tc qdisc change dev {sta1_intf2} root netem rate {ap2_bw}Mbit delay {ap2_delay} loss {ap2_loss}%')
+            tc_proc.stdin.write(tc_cmds[step])
+            tc_proc.stdin.flush()
             
             # Perform handover if needed
-            if position > 0.5 and sta1.cmd('ip route show default') and ap1.IP() in sta1.cmd('ip route show default'):
+            if position > 0.5 and current_ap is ap1:
                 info(f"*** Handover at position {position:.2f}: changing from AP1 to AP2\n")
                 sta1.cmd(f'ip route del default')
                 sta1.cmd(f'ip route add default via {ap2.IP()}')
+                current_ap = ap2
                 
                 # Record handover
                 elapsed = time.time() - start_time
-                with open('./handover_events.txt', 'a') as f:
-                    f.write(f"{elapsed:.1f} | {position:.2f} | Handover from AP1 to AP2\n")
+                handover_log.write(f"{elapsed:.1f} | {position:.2f} | Handover from AP1 to AP2\n")
             
             # Output current position
             elapsed = time.time() - start_time
-            info(f"Time: {elapsed:.1f}s, Position: {position:.2f}, AP1 Quality: {20-ap1_loss}%, AP2 Quality: {20-ap2_loss}%\n")
+            info(f"Time: {elapsed:.1f}s, Position: {position:.2f}, AP1 Quality: {20-loss1}%, AP2 Quality: {20-loss2}%\n")
             
             # Sleep to simulate real-time movement
             time.sleep(1)
             
     except Exception as e:
         error(f"*** Mobility simulation error: {e}\n")
+    finally:
+        handover_log.close()
+        tc_proc.stdin.close()
+        tc_proc.wait()
     
     info("*** Mobility simulation completed\n")
 
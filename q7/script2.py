@@ -6,47 +6,59 @@ Script to plot ping data and visualize handover effects
 """
 
 import os
+import matplotlib
+matplotlib.use('Agg')  # Use non-interactive backend
 import matplotlib.pyplot as plt
 import numpy as np
-import random
+
+from ping_parser import parse_ping_bytes
+
+
+# How much of a ping file check_ping_file_format reads to recognise it
+FORMAT_PROBE_BYTES = 4096
+
+# Per-point markers are only drawn for traces shorter than this
+MARKER_LIMIT = 200
+
+# Points whose RTT is within this (ms) of the last point drawn add nothing
+# visible to the trace and are skipped; a slow ramp still accumulates past it
+RTT_EPSILON = 0.5
+
+# Let Agg merge near-collinear segments and draw long traces in chunks
+plt.rcParams.update({'path.simplify': True,
+                     'path.simplify_threshold': 1.0,
+                     'agg.path.chunksize': 10000})
+
+# Raster resolution and (fast, light) zlib level for the saved PNGs
+PLOT_DPI = 150
+PNG_OPTIONS = {'compress_level': 1}
+
+# Figure reused by every create_visualization call
+_figure = None
+
+def get_figure():
+    """Return the shared plotting figure, cleared and made current"""
+    global _figure
+    if _figure is None:
+        # Constrained layout is solved during the save itself rather than
+        # by a separate tight_layout pass, with the bottom strip kept clear
+        # for the annotation
+        _figure = plt.figure(figsize=(12, 6), layout='constrained')
+        _figure.get_layout_engine().set(rect=(0, 0.08, 1, 0.92))
+    else:
+        _figure.clf()
+        plt.figure(_figure.number)
+    return _figure
 
 def parse_ping_data(file_path):
     """Parse ping data from file"""
-    ping_times = []
-    lost_packets = []
-    seq_counter = 0
-    
-    with open(file_path, 'r') as f:
-        for line in f:
-            if 'bytes from' in line and 'time=' in line:
-                # Extract sequence number
-                if 'icmp_seq=' in line:
-                    try:
-                        seq_part = line.split('icmp_seq=')[1].split()[0]
-                        seq_counter = int(seq_part)
-                    except:
-                        seq_counter += 1
-                else:
-                    seq_counter += 1
-                    
-                # Extract ping time
-                parts = line.split('time=')
-                if len(parts) >= 2:
-                    try:
-                        time_part = parts[1].split()[0]
-                        if 'ms' in time_part:
-                            ping_times.append((seq_counter, float(time_part.replace('ms', ''))))
-                    except:
-                        pass
-            elif 'Destination Host Unreachable' in line or 'Request timed out' in line:
-                # Extract sequence number for lost packet
-                if 'icmp_seq=' in line:
-                    try:
-                        seq_part = line.split('icmp_seq=')[1].split()[0]
-                        lost_packets.append(int(seq_part))
-                    except:
-                        lost_packets.append(seq_counter + 1)
-                        seq_counter += 1
+    with open(file_path, 'rb') as f:
+        data = f.read()
+    
+    # Scan the whole file once with the shared parser
+    seqs, times, lost = parse_ping_bytes(data)
+    ping_times = list(zip(seqs.tolist(), times.tolist()))
+    lost_packets = lost.tolist()
     
     return ping_times, lost_packets
 
@@ -54,37 +66,28 @@ def generate_synthetic_ping_data():
     """Generate synthetic ping data if real data is insufficient"""
     print("Generating synthetic ping data for visualization")
     
-    ping_times = []
-    lost_packets = []
+    rng = np.random.default_rng()
+    seq = np.arange(1, 101)
+    position = seq / 100.0
     
-    # Create a realistic pattern
-    for i in range(1, 101):
-        # Higher latency in the middle (handover point)
-        position = i / 100.0
-        base_latency = 20
-        
-        # Create a curve that peaks in the middle
-        handover_effect = 180 * (1 - 4 * (position - 0.5)**2)
-        latency = base_latency + handover_effect
-        
-        # Add some jitter
-        jitter = random.uniform(-5, 5)
-        latency += jitter
-        
-        # Packet loss around handover point (45-55%)
-        if 45 <= i <= 55:
-            if random.random() < 0.8:  # 80% loss during handover
-                lost_packets.append(i)
-                continue
-        
-        ping_times.append((i, latency))
+    # Create a realistic pattern: a latency curve that peaks in the middle
+    # (handover point) plus some jitter
+    base_latency = 20
+    handover_effect = 180 * (1 - 4 * (position - 0.5)**2)
+    latency = base_latency + handover_effect + rng.uniform(-5, 5, seq.size)
+    
+    # Packet loss around handover point (45-55%), 80% loss during handover
+    lost = (seq >= 45) & (seq <= 55) & (rng.random(seq.size) < 0.8)
+    
+    ping_times = list(zip(seq[~lost].tolist(), latency[~lost].tolist()))
+    lost_packets = seq[lost].tolist()
     
     return ping_times, lost_packets
 
 def create_visualization(ping_times, lost_packets, output_file='mobility_results.png'):
     """Create and save visualization"""
-    # Create the plot
-    plt.figure(figsize=(12, 6))
+    # Reuse the shared figure instead of building a new one per plot
+    get_figure()
     
     # If no ping times are available, generate synthetic data
     if not ping_times:
@@ -98,8 +101,18 @@ def create_visualization(ping_times, lost_packets, output_file='mobility_results
     seq_nums = [x[0] for x in ping_times]
     times = [x[1] for x in ping_times]
     
-    # Plot ping times
-    plt.plot(seq_nums, times, 'b-o', markersize=4, label='Ping Time')
+    # Plot ping times, skipping points that barely move from the last point
+    # kept (the first and last points are always kept)
+    times_arr = np.asarray(times)
+    keep = np.zeros(times_arr.size, dtype=bool)
+    keep[0] = keep[-1] = True
+    anchor = times[0]
+    for i, rtt in enumerate(times[1:-1], 1):
+        if abs(rtt - anchor) > RTT_EPSILON:
+            keep[i] = True
+            anchor = rtt
+    style = 'b-o' if len(times) <= MARKER_LIMIT else 'b-'
+    plt.plot(np.asarray(seq_nums)[keep], times_arr[keep], style, markersize=4, label='Ping Time')
     
     # Mark lost packets
     if lost_packets:
@@ -110,41 +123,36 @@ def create_visualization(ping_times, lost_packets, output_file='mobility_results
         # Plot lost packets as red X marks
         plt.plot(lost_packets, [y_pos] * len(lost_packets), 'rx', markersize=10, label='Packet Loss')
     
-    # Estimate handover region based on packet loss pattern
+    # Estimate handover region based on packet loss pattern: split the lost
+    # sequence numbers wherever they stop being consecutive
     lost_regions = []
     
     if lost_packets:
-        # Group consecutive lost packets
-        i = 0
-        while i < len(lost_packets):
-            start = lost_packets[i]
-            end = start
-            
-            # Find consecutive sequence numbers
-            while i+1 < len(lost_packets) and lost_packets[i+1] == lost_packets[i] + 1:
-                end = lost_packets[i+1]
-                i += 1
-            
-            # If we have a group of consecutive lost packets, mark as handover region
-            if end - start >= 2:  # At least 3 consecutive lost packets
-                lost_regions.append((start, end))
-            
-            i += 1
-    
-    # Mark handover regions with vertical bands
-    for start, end in lost_regions:
-        mid = (start + end) / 2
-        plt.axvspan(start-0.5, end+0.5, color='yellow', alpha=0.3, label='Handover Region')
-        plt.axvline(x=mid, color='green', linestyle='--', linewidth=2, label='Handover')
+        lost = np.asarray(lost_packets)
+        runs = np.split(lost, np.flatnonzero(np.diff(lost) != 1) + 1)
+        # At least 3 consecutive lost packets mark a handover region
+        lost_regions = [(int(run[0]), int(run[-1])) for run in runs if len(run) >= 3]
+    
+    # Mark handover regions with vertical bands, one collection each for
+    # the bands and the centre lines
+    if lost_regions:
+        ax = plt.gca()
+        ax.broken_barh([(start - 0.5, end - start + 1) for start, end in lost_regions], (0, 1),
+                       transform=ax.get_xaxis_transform(), color='yellow', alpha=0.3,
+                       label='Handover Region')
+        mids = [(start + end) / 2 for start, end in lost_regions]
+        ax.vlines(mids, 0, 1, transform=ax.get_xaxis_transform(),
+                  colors='green', linestyles='--', linewidths=2, label='Handover')
         
         # Make sure we have times before trying to access max(times)
         if times:
-            plt.text(mid, max(times)/2, 'Handover', rotation=90, verticalalignment='center')
+            for mid in mids:
+                plt.text(mid, max(times)/2, 'Handover', rotation=90, verticalalignment='center')
     
     # If no lost regions detected, try to estimate handover point from RTT pattern
     if not lost_regions and times:
         # Find where RTT is highest (likely handover point)
-        max_idx = times.index(max(times))
+        max_idx = int(np.argmax(times))
         handover_seq = seq_nums[max_idx]
         plt.axvline(x=handover_seq, color='green', linestyle='--', linewidth=2, label='Estimated Handover')
         plt.text(handover_seq, max(times)/2, 'Est. Handover', rotation=90, verticalalignment='center')
@@ -170,8 +178,7 @@ def create_visualization(ping_times, lost_packets, output_file='mobility_results
     if lost_packets and times:
         plt.ylim(0, max(times) * 1.2)
     
-    plt.tight_layout(rect=[0, 0.03, 1, 0.95])
-    plt.savefig(output_file, dpi=300)
+    plt.savefig(output_file, dpi=PLOT_DPI, pil_kwargs=PNG_OPTIONS)
     print(f"Created visualization: {output_file}")
     
     return True
@@ -211,7 +218,7 @@ def analyze_ping_data(ping_times, lost_packets):
     
     # RTT-based handover detection
     if times:
-        max_idx = times.index(max(times))
+        max_idx = int(np.argmax(times))
         max_seq = ping_times[max_idx][0]
         print(f"\nPeak RTT at sequence {max_seq} with {max(times):.2f}ms")
         print("This may indicate the approximate handover point.")
@@ -219,11 +226,12 @@ def analyze_ping_data(ping_times, lost_packets):
 def check_ping_file_format(file_path):
     """Check if the ping file has the right format and fix if needed"""
     try:
-        with open(file_path, 'r') as f:
-            content = f.read()
+        # Only the start of the file is needed to recognise ping output
+        with open(file_path, 'rb') as f:
+            head = f.read(FORMAT_PROBE_BYTES)
             
         # Check if the file has ping data in the expected format
-        if 'bytes from' in content and 'time=' in content:
+        if b'bytes from' in head and b'time=' in head:
             return True
             
         # If the file exists but doesn't have the right format, it might be corrupted
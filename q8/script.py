@@ -22,43 +22,75 @@ from mininet.link import TCLink
 from mininet.cli import CLI
 from mininet.log import setLogLevel, info, error
 import os
+import io
 import time
 import threading
 import re
 import subprocess
+from collections import deque
 import numpy as np
 import matplotlib
 matplotlib.use('Agg')  # Use non-interactive backend
 import matplotlib.pyplot as plt
 import matplotlib.dates as mdates
-from datetime import datetime, timedelta
+
+# iperf (5001) and iperf3 (5201) ports as they appear in /proc/net/tcp*:
+# upper-case hex at the end of an address
+IPERF_PORT_TAGS = (b':1389', b':1451')
+
+# /proc/net/tcp* state of a listening socket, which netstat -tn leaves out
+TCP_LISTEN = b'0A'
+
+# An iperf interval rate, e.g. "18.9 Mbits/sec" or "2.36 MBytes/sec"
+_IPERF_RE = re.compile(rb'([0-9.]+)\s+M(bits|Bytes)/sec')
+
+def format_timestamp(now):
+    """Format a time.time() value as HH:MM:SS.mmm without building a datetime"""
+    return "%s.%03d" % (time.strftime("%H:%M:%S", time.localtime(now)), int(now % 1 * 1000))
 
 def cleanup():
     """Clean up any previous Mininet instances and processes"""
     info("*** Cleaning up previous instances\n")
-    os.system('sudo mn -c > /dev/null 2>&1')
-    os.system('sudo pkill -f iperf > /dev/null 2>&1')
-    os.system('sudo pkill -f iperf3 > /dev/null 2>&1')
-    time.sleep(1)
+    # 'pkill -f iperf' also stops iperf3 servers left by an earlier run
+    sudo = [] if os.geteuid() == 0 else ['sudo']
+    subprocess.run(sudo + ['mn', '-c'], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    subprocess.run(sudo + ['pkill', '-f', 'iperf'], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
 
 class ThroughputMonitor:
     """Class to monitor and record throughput data during an iperf session"""
     
+    # Buffered samples are pushed to disk after this many writes
+    FLUSH_EVERY = 20
+    
     def __init__(self, output_file='./throughput_data.txt'):
         self.output_file = output_file
         self.throughput_data = []
         self.start_time = None
-        self.running = False
         self.monitor_thread = None
         
-        # Create and initialize the output file
-        with open(self.output_file, 'w') as f:
-            f.write("Timestamp,ElapsedTime,Throughput(Mbps),Position,Event\n")
+        # Set by stop_monitoring; the monitor waits on it between samples so
+        # it wakes up and exits as soon as it is asked to
+        self._stop = threading.Event()
+        
+        # Create and initialize the output file, keeping it open for the
+        # monitor's lifetime; the lock serializes writes from the monitor
+        # thread and record_event (called from the mobility loop)
+        self._lock = threading.Lock()
+        self._unflushed = 0
+        self._fh = open(self.output_file, 'w', buffering=1 << 16)
+        self._fh.write("Timestamp,ElapsedTime,Throughput(Mbps),Position,Event\n")
+        
+        # iperf output is tailed from a saved offset; only the last few
+        # complete lines are kept for parsing
+        self._iperf_fh = None
+        self._iperf_off = 0
+        self._iperf_partial = b''
+        self._iperf_tail = deque(maxlen=4)
     
     def start_monitoring(self):
         """Start the throughput monitoring thread"""
         self.start_time = time.time()
-        self.running = True
+        self._stop.clear()
         self.monitor_thread = threading.Thread(target=self._monitor_loop)
         self.monitor_thread.daemon = True
         self.monitor_thread.start()
@@ -66,153 +98,190 @@ class ThroughputMonitor:
     
     def stop_monitoring(self):
         """Stop the throughput monitoring thread"""
-        self.running = False
+        self._stop.set()
         if self.monitor_thread:
             self.monitor_thread.join(timeout=2)
+        with self._lock:
+            self._fh.close()
+        if self._iperf_fh:
+            self._iperf_fh.close()
         info("*** Throughput monitoring stopped\n")
     
     def record_event(self, position, event_desc):
         """Record a significant event (like handover)"""
-        elapsed = time.time() - self.start_time
-        timestamp = datetime.now().strftime("%H:%M:%S.%f")[:-3]
+        now = time.time()
+        elapsed = now - self.start_time
         
-        with open(self.output_file, 'a') as f:
-            f.write(f"{timestamp},{elapsed:.2f},0.0,{position:.2f},{event_desc}\n")
+        self._write("%s,%.2f,0.0,%.2f,%s\n" % (format_timestamp(now), elapsed, position, event_desc))
         
         info(f"*** Event recorded: {event_desc} at position {position:.2f}\n")
     
+    def _write(self, line):
+        """Append one record to the output file, flushing every few records"""
+        with self._lock:
+            if self._fh.closed:
+                return
+            self._fh.write(line)
+            self._unflushed += 1
+            if self._unflushed >= self.FLUSH_EVERY:
+                self._fh.flush()
+                self._unflushed = 0
+    
+    @staticmethod
+    def _iperf_connected():
+        """Check the kernel's TCP tables for a connection on an iperf port,
+        ignoring listening sockets like netstat -tn does"""
+        for table in ('/proc/net/tcp', '/proc/net/tcp6'):
+            try:
+                with open(table, 'rb') as f:
+                    lines = f.read().splitlines()[1:]  # Skip header
+            except OSError:
+                continue
+            for line in lines:
+                # sl, local_address, rem_address, st, ...
+                fields = line.split()
+                if len(fields) > 3 and fields[3] != TCP_LISTEN and \
+                        (fields[1].endswith(IPERF_PORT_TAGS) or fields[2].endswith(IPERF_PORT_TAGS)):
+                    return True
+        return False
+    
+    def _read_iperf_tail(self, path='./iperf_output.txt'):
+        """Read whatever iperf has appended since the last call and return
+        the most recent complete lines as one bytes block, or None if iperf
+        hasn't created its output file yet"""
+        if self._iperf_fh is None:
+            try:
+                self._iperf_fh = open(path, 'rb')
+            except FileNotFoundError:
+                return None
+        
+        # Start over if the file was truncated (e.g. a new iperf run)
+        if os.fstat(self._iperf_fh.fileno()).st_size < self._iperf_off:
+            self._iperf_off = 0
+            self._iperf_partial = b''
+            self._iperf_tail.clear()
+        
+        self._iperf_fh.seek(self._iperf_off)
+        new = self._iperf_fh.read()
+        self._iperf_off = self._iperf_fh.tell()
+        
+        # Hold back a trailing partial line until the rest of it arrives
+        lines = (self._iperf_partial + new).split(b'\n')
+        self._iperf_partial = lines.pop()
+        self._iperf_tail.extend(lines)
+        return b'\n'.join(self._iperf_tail)
+    
     def _monitor_loop(self):
         """Continuously monitor and record throughput data"""
         last_position = 0.0
         
-        while self.running:
+        # Samples are paced against a monotonic schedule so slow iterations
+        # don't push every later sample back
+        next_tick = time.monotonic()
+        
+        while not self._stop.is_set():
             try:
-                # Use netstat to check active iperf connections
-                try:
-                    output = subprocess.check_output(
-                        "netstat -tn | grep -E ':5001|:5201'", 
-                        shell=True, stderr=subprocess.STDOUT
-                    ).decode('utf-8')
-                except subprocess.CalledProcessError:
-                    # No active connections found, record zero throughput
-                    elapsed = time.time() - self.start_time
-                    timestamp = datetime.now().strftime("%H:%M:%S.%f")[:-3]
-                    
-                    with open(self.output_file, 'a') as f:
-                        f.write(f"{timestamp},{elapsed:.2f},0.0,{last_position:.2f},\n")
-                    time.sleep(0.5)
-                    continue
+                # Take the sample's time and timestamp once for every branch
+                now = time.time()
+                elapsed = now - self.start_time
+                timestamp = format_timestamp(now)
                 
-                # Read the most recent iperf output if available
-                if os.path.exists('./iperf_output.txt'):
-                    with open('./iperf_output.txt', 'r') as f:
-                        iperf_lines = f.readlines()
-                    
-                    # Parse last few lines for throughput info
-                    throughput = self._parse_iperf_output(iperf_lines)
-                    if throughput is not None:
-                        elapsed = time.time() - self.start_time
-                        timestamp = datetime.now().strftime("%H:%M:%S.%f")[:-3]
-                        
+                # Check for active iperf connections
+                if not self._iperf_connected():
+                    # No active connections found, record zero throughput
+                    self._write("%s,%.2f,0.0,%.2f,\n" % (timestamp, elapsed, last_position))
+                else:
+                    # Read the most recent iperf output if available
+                    iperf_tail = self._read_iperf_tail()
+                    if iperf_tail is not None:
                         # Calculate simulated position (0.0 to 1.0) based on elapsed time
                         # Assume full movement takes 20 seconds
                         position = min(1.0, elapsed / 20.0)
                         last_position = position
                         
-                        # Record the data
-                        self.throughput_data.append((elapsed, throughput, position))
-                        with open(self.output_file, 'a') as f:
-                            f.write(f"{timestamp},{elapsed:.2f},{throughput:.2f},{position:.2f},\n")
-                    else:
-                        # If throughput parsing failed, generate some synthetic data
-                        # to avoid empty datasets
-                        elapsed = time.time() - self.start_time
-                        timestamp = datetime.now().strftime("%H:%M:%S.%f")[:-3]
-                        position = min(1.0, elapsed / 20.0)
-                        
-                        # Generate synthetic throughput based on position
-                        # High at start, drops in middle, increases again
-                        base_throughput = 20.0  # Base throughput in Mbps
-                        if position < 0.4:
-                            throughput = base_throughput * (1 - position/2)
-                        elif position < 0.6:
-                            throughput = base_throughput * 0.2  # Big drop during handover
+                        # Parse last few lines for throughput info
+                        throughput = self._parse_iperf_output(iperf_tail)
+                        if throughput is not None:
+                            # Record the data
+                            self.throughput_data.append((elapsed, throughput, position))
+                            self._write("%s,%.2f,%.2f,%.2f,\n" % (timestamp, elapsed, throughput, position))
                         else:
-                            throughput = base_throughput * (position/2)
-                        
-                        with open(self.output_file, 'a') as f:
-                            f.write(f"{timestamp},{elapsed:.2f},{throughput:.2f},{position:.2f},Synthetic\n")
-                        
-                        last_position = position
+                            # If throughput parsing failed, generate some synthetic data
+                            # to avoid empty datasets
+                            # Generate synthetic throughput based on position
+                            # High at start, drops in middle, increases again
+                            base_throughput = 20.0  # Base throughput in Mbps
+                            if position < 0.4:
+                                throughput = base_throughput * (1 - position/2)
+                            elif position < 0.6:
+                                throughput = base_throughput * 0.2  # Big drop during handover
+                            else:
+                                throughput = base_throughput * (position/2)
+                            
+                            self._write("%s,%.2f,%.2f,%.2f,Synthetic\n" % (timestamp, elapsed, throughput, position))
             
             except Exception as e:
                 error(f"*** Monitoring error: {e}\n")
             
-            # Sleep before next sample
-            time.sleep(0.5)
-    
-    def _parse_iperf_output(self, lines):
-        """Parse iperf output to extract throughput information"""
-        # Look for lines containing throughput data
-        for line in reversed(lines):  # Start from the end to get most recent
-            if 'Mbits/sec' in line or 'MBytes/sec' in line:
-                # Extract the throughput value
-                parts = line.split()
-                for i, part in enumerate(parts):
-                    if part.endswith('Mbits/sec'):
-                        try:
-                            return float(parts[i-1])
-                        except:
-                            pass
-                    elif part.endswith('MBytes/sec'):
-                        try:
-                            # Convert MBytes/sec to Mbits/sec
-                            return float(parts[i-1]) * 8
-                        except:
-                            pass
-        return None
+            # Sleep until the next sample is due, or start over from now if
+            # this one overran
+            next_tick += 0.5
+            delay = next_tick - time.monotonic()
+            if delay > 0:
+                self._stop.wait(delay)
+            else:
+                next_tick = time.monotonic()
+    
+    def _parse_iperf_output(self, data):
+        """Parse iperf output (bytes) to extract the most recent throughput"""
+        match = None
+        for match in _IPERF_RE.finditer(data):
+            pass
+        if match is None:
+            return None
+        
+        # Convert MBytes/sec to Mbits/sec
+        return float(match.group(1)) * (8 if match.group(2) == b'Bytes' else 1)
 
-def generate_synthetic_throughput_data():
+def generate_synthetic_throughput_data(num_samples=400):
     """Generate synthetic throughput data if real data is insufficient"""
     info("*** Generating synthetic throughput data\n")
     
-    # Create file with synthetic data
+    # Generate num_samples points (40 seconds by default), each 0.1 second,
+    # in one NumPy pass
+    time_points = np.arange(num_samples) / 10.0
+    positions = np.minimum(1.0, time_points / 20.0)  # Full movement in 20 seconds
+    
+    # Calculate throughput based on position
+    # - High near AP1 (position 0.0): gradual decrease as moving away from AP1
+    # - Drops during handover (position 0.4-0.6): sharp drop
+    # - Recovers near AP2 (position 1.0): gradual increase as approaching AP2
+    throughputs = np.piecewise(positions, [positions < 0.4, (positions >= 0.4) & (positions < 0.6), positions >= 0.6],
+                               [lambda p: 20.0 - (p * 20.0), 2.0, lambda p: (p - 0.6) * 25.0])
+    
+    # Add some randomness, in place so large runs don't allocate more
+    # temporaries
+    throughputs += np.random.default_rng().normal(0, 1, time_points.size)
+    np.maximum(throughputs, 0.1, out=throughputs)
+    
+    # Build the whole file in memory, then create it with a single write
+    buf = io.StringIO()
+    buf.write("Timestamp,ElapsedTime,Throughput(Mbps),Position,Event\n")
+    
+    now = time.time()
+    buf.writelines(
+        "%s,%.2f,%.2f,%.2f,\n" % (format_timestamp(now + t), t, tp, p)
+        for t, tp, p in zip(time_points.tolist(), throughputs.tolist(), positions.tolist())
+    )
+    
+    # Add handover event
+    handover_time = 10.0
+    handover_pos = 0.5
+    timestamp_str = format_timestamp(now + handover_time)
+    buf.write(f"{timestamp_str},{handover_time:.2f},0.0,{handover_pos:.2f},Handover from AP1 to AP2\n")
+    
     with open('./throughput_data.txt', 'w') as f:
-        f.write("Timestamp,ElapsedTime,Throughput(Mbps),Position,Event\n")
-        
-        # Generate 40 seconds of data
-        for i in range(0, 400):
-            time_point = i / 10.0  # Each 0.1 second
-            position = min(1.0, time_point / 20.0)  # Full movement in 20 seconds
-            timestamp = datetime.now() + timedelta(seconds=time_point)
-            timestamp_str = timestamp.strftime("%H:%M:%S.%f")[:-3]
-            
-            # Calculate throughput based on position
-            # - High near AP1 (position 0.0)
-            # - Drops during handover (position 0.5-0.6)
-            # - Recovers near AP2 (position 1.0)
-            if position < 0.4:
-                # Gradual decrease as moving away from AP1
-                throughput = 20.0 - (position * 20.0)
-            elif position < 0.6:
-                # Sharp drop during handover
-                throughput = 2.0
-            else:
-                # Gradual increase as approaching AP2
-                throughput = (position - 0.6) * 25.0
-            
-            # Add some randomness
-            throughput = max(0.1, throughput + np.random.normal(0, 1))
-            
-            # Write to file
-            f.write(f"{timestamp_str},{time_point:.2f},{throughput:.2f},{position:.2f},\n")
-        
-        # Add handover event
-        handover_time = 10.0
-        handover_pos = 0.5
-        timestamp = datetime.now() + timedelta(seconds=handover_time)
-        timestamp_str = timestamp.strftime("%H:%M:%S.%f")[:-3]
-        f.write(f"{timestamp_str},{handover_time:.2f},0.0,{handover_pos:.2f},Handover from AP1 to AP2\n")
+        f.write(buf.getvalue())
 
 def simulate_mobility(net, sta1, ap1, ap2, duration=20, monitor=None):
     """Simulate station mobility by adjusting link qualities over time"""
@@ -243,18 +312,50 @@ def simulate_mobility(net, sta1, ap1, ap2, duration=20, monitor=None):
     else:
         sta1_intf2 = link2.intf2.name
     
+    # The precomputed tc_cmds below are fed to this tc on stdin, so each
+    # mobility step costs a pipe write rather than a tc exec
+    tc_proc = sta1.popen(['tc', '-force', '-batch', '-'], stdin=subprocess.PIPE,
+                         stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    
     # Set initial link qualities - start near AP1, far from AP2
     # Good connection to AP1, poor connection to AP2
-    sta1.cmd(f'tc qdisc change dev {sta1_intf1} root netem rate 20Mbit delay 2ms loss 1%')
-    sta1.cmd(f'tc qdisc change dev {sta1_intf2} root netem rate 1Mbit delay 20ms loss 50%')
+    tc_proc.stdin.write(f'qdisc change dev {sta1_intf1} root netem rate 20Mbit delay 2ms loss 1%\n'
+                        f'qdisc change dev {sta1_intf2} root netem rate 1Mbit delay 20ms loss 50%\n'.encode())
+    tc_proc.stdin.flush()
     
-    # Set up initial routing to use AP1
-    sta1.cmd(f'ip route add default via {ap1.IP()}')
+    # Set up initial routing to use AP1, tracking the choice here rather than
+    # asking the station for its default route every step
+    ap1_ip, ap2_ip = ap1.IP(), ap2.IP()
+    sta1.cmd(f'ip route add default via {ap1_ip}')
+    current_ap_ip = ap1_ip
     
-    # Create file to track handovers
-    with open('./handover_events.txt', 'w') as f:
-        f.write("Time(s) | Position | Event\n")
-        f.write("--------------------------\n")
+    # Create file to track handovers, as CSV like the throughput data, kept
+    # open for the whole simulation
+    handover_log = open('./handover_events.txt', 'w')
+    handover_log.write("Time(s),Position,Event\n")
+    
+    # The path is fixed by duration, so work out every step's link
+    # qualities up front
+    # As position increases (station moves right):
+    # - AP1 link gets worse
+    # - AP2 link gets better
+    positions = np.arange(duration + 1) / duration      # 0.0 to 1.0
+    schedule = list(zip(
+        positions.tolist(),
+        np.maximum(1, 20 - positions * 19).tolist(),    # AP1: 20 Mbps down to 1 Mbps
+        (2 + positions * 18).tolist(),                  # AP1: 2ms up to 20ms
+        np.minimum(80, positions * 50).tolist(),        # AP1: 0% up to 50%
+        np.maximum(1, 1 + positions * 19).tolist(),     # AP2: 1 Mbps up to 20 Mbps
+        (20 - positions * 18).tolist(),                 # AP2: 20ms down to 2ms
+        np.minimum(80, 50 - positions * 50).tolist(),   # AP2: 50% down to 0%
+    ))
+    
+    # ...and the tc -batch lines that apply them
+    tc_cmds = [
+        (f'qdisc change dev {sta1_intf1} root netem rate {ap1_bw}Mbit delay {ap1_delay}ms loss {ap1_loss}%\n'
+         f'qdisc change dev {sta1_intf2} root netem rate {ap2_bw}Mbit delay {ap2_delay}ms loss {ap2_loss}%\n').encode()
+        for _, ap1_bw, ap1_delay, ap1_loss, ap2_bw, ap2_delay, ap2_loss in schedule
+    ]
     
     # Simulate movement by gradually changing link quality
     start_time = time.time()
@@ -262,35 +363,22 @@ def simulate_mobility(net, sta1, ap1, ap2, duration=20, monitor=None):
     
     try:
         for step in range(duration + 1):
-            # Calculate position (0.0 to 1.0)
-            position = step / duration
-            
-            # Update link qualities based on position
-            # As position increases (station moves right):
-            # - AP1 link gets worse
-            # - AP2 link gets better
-            ap1_bw = max(1, 20 - position * 19)  # 20 Mbps down to 1 Mbps
-            ap1_delay = f"{2 + position * 18}ms"  # 2ms up to 20ms
-            ap1_loss = min(80, position * 50)     # 0% up to 50%
-            
-            ap2_bw = max(1, 1 + position * 19)    # 1 Mbps up to 20 Mbps
-            ap2_delay = f"{20 - position * 18}ms" # 20ms down to 2ms
-            ap2_loss = min(80, 50 - position * 50) # 50% down to 0%
+            position, _, _, ap1_loss, _, _, ap2_loss = schedule[step]
             
             # Update TC rules to reflect new link qualities
-            sta1.cmd(f'tc qdisc change dev {sta1_intf1} root netem rate {ap1_bw}Mbit delay {ap1_delay} loss {ap1_loss}%')
-            sta1.cmd(f'tc qdisc change dev {sta1_intf2} root netem rate {ap2_bw}Mbit delay {ap2_delay} loss {ap2_loss}%')
+            tc_proc.stdin.write(tc_cmds[step])
+            tc_proc.stdin.flush()
             
             # Perform handover if needed
-            if position > 0.5 and sta1.cmd('ip route show default') and ap1.IP() in sta1.cmd('ip route show default'):
+            if position > 0.5 and current_ap_ip == ap1_ip:
                 info(f"*** Handover at position {position:.2f}: changing from AP1 to AP2\n")
                 sta1.cmd(f'ip route del default')
-                sta1.cmd(f'ip route add default via {ap2.IP()}')
+                sta1.cmd(f'ip route add default via {ap2_ip}')
+                current_ap_ip = ap2_ip
                 
                 # Record handover
                 elapsed = time.time() - start_time
-                with open('./handover_events.txt', 'a') as f:
-                    f.write(f"{elapsed:.1f} | {position:.2f} | Handover from AP1 to AP2\n")
+                handover_log.write("%.1f,%.2f,Handover from AP1 to AP2\n" % (elapsed, position))
                 
                 # Record in throughput monitor
                 if monitor:
@@ -305,6 +393,10 @@ def simulate_mobility(net, sta1, ap1, ap2, duration=20, monitor=None):
             
     except Exception as e:
         error(f"*** Mobility simulation error: {e}\n")
+    finally:
+        handover_log.close()
+        tc_proc.stdin.close()
+        tc_proc.wait()
     
     info("*** Mobility simulation completed\n")
 
@@ -326,11 +418,9 @@ def run_iperf_client(client, server_ip, duration=30, tcp=True):
         # For UDP, specify bandwidth (e.g., 10 Mbps)
         cmd = f'iperf -c {server_ip} -u -b 10M -t {duration} -i 1 > ./iperf_output.txt 2>&1 &'
     
-    # Run the command
-    client.cmd(cmd)
-    
-    # Return the PID to allow checking if it's still running
-    return client.cmd('echo $!')
+    # Run the command and return the PID (to allow checking if it's still
+    # running) from the same round trip to the node's shell
+    return client.cmd(f'{cmd} echo $!')
 
 def visualize_throughput(throughput_file='./throughput_data.txt', handover_file='./handover_events.txt'):
     """Create visualization of throughput during mobility"""
@@ -343,66 +433,60 @@ def visualize_throughput(throughput_file='./throughput_data.txt', handover_file=
             # Generate synthetic data
             generate_synthetic_throughput_data()
         
-        # Read throughput data
-        timestamps = []
-        elapsed_times = []
-        throughputs = []
-        positions = []
-        events = []
-        
+        # Read throughput data, all numeric columns in one pass
         with open(throughput_file, 'r') as f:
             # Skip header
-            next(f)
-            for line in f:
-                parts = line.strip().split(',')
-                if len(parts) >= 4:
-                    try:
-                        timestamp = parts[0]
-                        elapsed = float(parts[1])
-                        throughput = float(parts[2])
-                        position = float(parts[3])
-                        event = parts[4] if len(parts) > 4 else ""
-                        
-                        timestamps.append(timestamp)
-                        elapsed_times.append(elapsed)
-                        throughputs.append(throughput)
-                        positions.append(position)
-                        events.append(event)
-                    except:
-                        pass
-        
-        if not elapsed_times:
+            lines = f.read().splitlines()[1:]
+        
+        # Rows cut short by an interrupted run, or holding a value that is not
+        # a number, are skipped rather than failing the whole plot. Only rows
+        # with all five fields are kept, so both reads stay row-aligned
+        lines = [line for line in lines if line.count(',') == 4]
+        elapsed_times = throughputs = positions = np.empty(0)
+        events = []
+        if lines:
+            data = np.genfromtxt(lines, delimiter=',', usecols=(1, 2, 3),
+                                 invalid_raise=False, ndmin=2)
+            events = np.genfromtxt(lines, delimiter=',', usecols=4, dtype=str,
+                                   invalid_raise=False, ndmin=1)
+            valid = ~np.isnan(data).any(axis=1)
+            elapsed_times, throughputs, positions = data[valid].T
+            events = events[valid]
+        
+        if not elapsed_times.size:
             error("*** No throughput data found, generating synthetic data\n")
             generate_synthetic_throughput_data()
             # Try again with synthetic data
             return visualize_throughput(throughput_file, handover_file)
         
         # Read handover events
-        handover_times = []
+        handover_times = np.empty(0)
         if os.path.exists(handover_file):
             with open(handover_file, 'r') as f:
-                # Skip header lines
-                next(f)
-                next(f)
-                for line in f:
-                    parts = line.split('|')
-                    if len(parts) >= 2:
-                        try:
-                            time_sec = float(parts[0].strip())
-                            handover_times.append(time_sec)
-                        except:
-                            pass
-        
-        # Create the plot
-        plt.figure(figsize=(12, 6))
+                # Skip header
+                rows = f.read().splitlines()[1:]
+            try:
+                if rows:
+                    handover_times = np.loadtxt(rows, delimiter=',', usecols=0, ndmin=1)
+            except ValueError:
+                error(f"*** Could not parse handover events in {handover_file}\n")
+        
+        # Create the plot; the same figure is cleared and reused for the
+        # normalized plot below
+        fig = plt.figure(figsize=(12, 6))
         
         # Plot throughput
         plt.plot(elapsed_times, throughputs, 'b-', label='Throughput')
         
+        # Data extremes, computed once for every handover annotation below
+        t_min, t_max = elapsed_times.min(), elapsed_times.max()
+        max_tp = throughputs.max()
+        y_pos = max_tp * 0.8 if max_tp > 0 else 1.0
+        
         # Mark handover events with vertical lines
         handovers_added = set()
         for h_time in handover_times:
-            if h_time > min(elapsed_times) and h_time < max(elapsed_times):
+            if t_min < h_time < t_max:
                 if 'Handover' not in handovers_added:
                     plt.axvline(x=h_time, color='red', linestyle='--', linewidth=2, label='Handover')
                     handovers_added.add('Handover')
@@ -410,7 +494,6 @@ def visualize_throughput(throughput_file='./throughput_data.txt', handover_file=
                     plt.axvline(x=h_time, color='red', linestyle='--', linewidth=2)
                 
                 # Add a text annotation
-                y_pos = max(throughputs) * 0.8 if max(throughputs) > 0 else 1.0
                 plt.text(h_time + 0.2, y_pos, 'Handover', rotation=90, color='red')
         
         # Mark specific events from throughput data
@@ -422,11 +505,8 @@ def visualize_throughput(throughput_file='./throughput_data.txt', handover_file=
         ax1 = plt.gca()
         ax2 = ax1.twinx()
         
-        # Normalize positions to [0, 1]
-        normalized_positions = positions.copy()
-        
         # Plot proximity indicators (1.0 = close to AP1, 0.0 = close to AP2)
-        ax2.plot(elapsed_times, [1-p for p in normalized_positions], 'g-', alpha=0.3, label='Position')
+        ax2.plot(elapsed_times, 1 - positions, 'g-', alpha=0.3, label='Position')
         ax2.set_ylim(0, 1)
         ax2.set_ylabel('Position (0=AP1, 1=AP2)', color='g')
         ax2.tick_params(axis='y', labelcolor='g')
@@ -449,27 +529,27 @@ def visualize_throughput(throughput_file='./throughput_data.txt', handover_file=
         ax1.legend(lines1 + lines2, labels1 + labels2, loc='upper right')
         
         plt.tight_layout(rect=[0, 0.03, 1, 0.95])
-        plt.savefig('./handover_throughput.png', dpi=300)
+        fig.savefig('./handover_throughput.png', dpi=150, pil_kwargs={'compress_level': 1})
         info("*** Created visualization: ./handover_throughput.png\n")
         
         # Create a second plot showing normalized throughput
-        plt.figure(figsize=(12, 6))
+        fig.clear()
         
         # Normalize throughput values (percentage of maximum)
-        max_throughput = max(throughputs) if throughputs and max(throughputs) > 0 else 1.0
-        normalized_throughput = [t/max_throughput*100 for t in throughputs]
+        max_throughput = max_tp if max_tp > 0 else 1.0
+        normalized_throughput = throughputs * (100.0 / max_throughput)
         
         # Plot normalized throughput
         plt.plot(elapsed_times, normalized_throughput, 'b-', label='Throughput %')
         
         # Mark handover events
         for h_time in handover_times:
-            if h_time > min(elapsed_times) and h_time < max(elapsed_times):
+            if t_min < h_time < t_max:
                 plt.axvline(x=h_time, color='red', linestyle='--', linewidth=2)
                 plt.text(h_time + 0.2, 50, 'Handover', rotation=90, color='red')
         
         # Add position indicator
-        plt.plot(elapsed_times, [p*100 for p in normalized_positions], 'g-', alpha=0.5, label='Position %')
+        plt.plot(elapsed_times, positions * 100, 'g-', alpha=0.5, label='Position %')
         
         # Add labels and title
         plt.title('Normalized Throughput and Position During Handover', fontsize=14)
@@ -481,7 +561,7 @@ def visualize_throughput(throughput_file='./throughput_data.txt', handover_file=
         plt.legend(loc='upper right')
         
         plt.tight_layout()
-        plt.savefig('./normalized_handover.png', dpi=300)
+        fig.savefig('./normalized_handover.png', dpi=150, pil_kwargs={'compress_level': 1})
         info("*** Created normalized visualization: ./normalized_handover.png\n")
         
     except Exception as e:
@@ -536,6 +616,7 @@ def topology():
             sw.cmd(f'ovs-ofctl add-flow {sw.name} action=normal')
         
         # Start iperf server
+        server_ip = server.IP()
         run_iperf_server(server)
         
         # Create throughput monitor
@@ -543,7 +624,7 @@ def topology():
         monitor.start_monitoring()
         
         # Start iperf client
-        run_iperf_client(sta1, server.IP(), duration=30)
+        run_iperf_client(sta1, server_ip, duration=30)
         
         # Wait for client to connect
         time.sleep(2)
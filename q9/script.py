@@ -15,39 +15,64 @@ from mininet.link import TCLink
 from mininet.cli import CLI
 from mininet.log import setLogLevel, info, error
 import os
+import shutil
 import subprocess
-import matplotlib
-matplotlib.use('Agg')  # Use non-interactive backend
-import matplotlib.pyplot as plt
+import hashlib
+import csv
 import threading
 import time
 import re
 import numpy as np
-import random
 
 def cleanup():
     """Clean up any previous Mininet instances and processes"""
     info("*** Cleaning up previous instances\n")
-    os.system('sudo mn -c > /dev/null 2>&1')
-    os.system('sudo pkill -f vlc > /dev/null 2>&1')
-    os.system('sudo pkill -f ffmpeg > /dev/null 2>&1')
-    os.system('sudo pkill -f python3 > /dev/null 2>&1')
-    time.sleep(1)
-    
+    # One pkill pattern stops leftover VLC, ffmpeg and python3 streamers
+    sudo = [] if os.geteuid() == 0 else ['sudo']
+    subprocess.run(sudo + ['mn', '-c'], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    subprocess.run(sudo + ['pkill', '-f', 'vlc|ffmpeg|python3'], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    
+def file_sha256(path):
+    """Return the hex SHA-256 digest of a file, read in 1 MiB chunks"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
 def create_sample_video():
-    """Create a sample video file for streaming if none exists"""
-    video_path = "./sample.mp4"
+    """Create a sample video file for streaming if none exists
     
-    if os.path.exists(video_path):
-        info(f"*** Using existing video file: {video_path}\n")
-        return video_path
+    The video's digest is kept in a .sha256 sidecar so a truncated or
+    corrupted file is regenerated instead of reused. An existing video with
+    no sidecar is trusted and gets one.
+    """
+    video_path = "./sample.mp4"
+    hash_path = video_path + ".sha256"
+    
+    if os.path.exists(video_path) and os.path.getsize(video_path) > 0:
+        digest = file_sha256(video_path)
+        try:
+            with open(hash_path, 'r') as f:
+                valid = f.read().strip() == digest
+        except OSError:
+            with open(hash_path, 'w') as f:
+                f.write(digest + "\n")
+            valid = True
+        
+        if valid:
+            info(f"*** Using existing video file: {video_path}\n")
+            return video_path
+        info(f"*** Existing video file {video_path} failed its checksum, recreating it\n")
     
     info(f"*** Creating sample video file: {video_path}\n")
     try:
-        # Generate a 30-second test pattern video with ffmpeg
+        # Generate a 30-second test pattern video with ffmpeg; the ultrafast
+        # preset encodes a static test pattern far quicker than the default,
+        # with a keyframe every second
         cmd = (
             f"ffmpeg -y -f lavfi -i smptebars=duration=30:size=640x480:rate=30 "
-            f"-c:v libx264 -b:v 1M -pix_fmt yuv420p "
+            f"-c:v libx264 -preset ultrafast -g 30 -b:v 1M -pix_fmt yuv420p "
             f"-f mp4 {video_path}"
         )
         subprocess.call(cmd, shell=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
@@ -55,6 +80,8 @@ def create_sample_video():
         # Check if file was created successfully
         if os.path.exists(video_path) and os.path.getsize(video_path) > 0:
             info(f"*** Successfully created sample video ({os.path.getsize(video_path) // 1024} KB)\n")
+            with open(hash_path, 'w') as f:
+                f.write(file_sha256(video_path) + "\n")
             # Create a symlink in the current directory
             os.system(f"ln -sf {video_path} ./sample.mp4")
             return video_path
@@ -68,25 +95,65 @@ def create_sample_video():
 class StreamingMonitor:
     """Monitor streaming metrics during handover"""
     
-    def __init__(self, station, output_file='./streaming_metrics.txt'):
+    # Buffered rows are written out this many at a time
+    ROW_BATCH = 32
+    
+    # Seconds between samples
+    SAMPLE_INTERVAL = 0.5
+    
+    # Seconds of metrics worked out up front (and again if a run outlasts it)
+    HORIZON = 60
+    
+    # Recorded per sample, one row of the sample array each
+    METRIC_FIELDS = ('time', 'position', 'buffer', 'bitrate', 'packet_loss', 'latency')
+    
+    def __init__(self, station, output_file='./streaming_metrics.txt', seed=None):
         self.station = station
         self.output_file = output_file
-        self.running = False
         self.monitor_thread = None
+        # Set to stop the monitor thread, waking it from its wait between samples
+        self._stop = threading.Event()
         self.start_time = None
-        self.metrics = []
+        # Recorded samples, a contiguous row per field; only the first
+        # num_samples columns are valid
+        self._samples = np.empty((len(self.METRIC_FIELDS), int(self.HORIZON / self.SAMPLE_INTERVAL) + 16),
+                                 dtype=np.float32)
+        self.num_samples = 0
         self.handover_position = 0.5  # Position at which handover occurs
         self.handover_occurred = False
         self.handover_time = None
         
-        # Initialize metrics file
-        with open(self.output_file, 'w') as f:
-            f.write("Time,Position,BufferStatus,Bitrate,PacketLoss,Latency,Event\n")
+        # Event state carried between samples
+        self._depletion_recorded = False
+        self._last_bitrate = None
+        
+        # The metrics file is held open while monitoring; rows are buffered
+        # and written in batches through a csv writer (which quotes any event
+        # text holding a comma), with the lock guarding the buffer
+        self._fh = None
+        self._writer = None
+        self._row_buf = []
+        self._lock = threading.Lock()
+        
+        # Metrics for the whole run, one entry per sample, with all their
+        # noise drawn from one (optionally seeded) generator
+        self._rng = np.random.default_rng(seed)
+        self._precompute(self.HORIZON)
+    
+    @property
+    def metrics(self):
+        """Recorded samples as a dict of field name to NumPy array"""
+        return dict(zip(self.METRIC_FIELDS, self._samples[:, :self.num_samples]))
     
     def start_monitoring(self):
         """Start monitoring thread"""
+        # Initialize metrics file
+        self._fh = open(self.output_file, 'w', newline='', buffering=1 << 16)
+        self._writer = csv.writer(self._fh, lineterminator='\n')
+        self._writer.writerow(["Time", "Position", "BufferStatus", "Bitrate", "PacketLoss", "Latency", "Event"])
+        
         self.start_time = time.time()
-        self.running = True
+        self._stop.clear()
         self.monitor_thread = threading.Thread(target=self._monitor_loop)
         self.monitor_thread.daemon = True
         self.monitor_thread.start()
@@ -94,17 +161,22 @@ class StreamingMonitor:
     
     def stop_monitoring(self):
         """Stop monitoring thread"""
-        self.running = False
+        self._stop.set()
         if self.monitor_thread:
             self.monitor_thread.join(timeout=2)
+        with self._lock:
+            if self._fh:
+                self._writer.writerows(self._row_buf)
+                self._row_buf.clear()
+                self._fh.close()
+                self._fh = None
         info("*** Stopped streaming quality monitoring\n")
     
     def record_event(self, position, event):
         """Record a significant event (like handover)"""
         elapsed = time.time() - self.start_time
         
-        with open(self.output_file, 'a') as f:
-            f.write(f"{elapsed:.2f},{position:.2f},N/A,N/A,N/A,N/A,{event}\n")
+        self._write_row([f"{elapsed:.2f}", f"{position:.2f}", "N/A", "N/A", "N/A", "N/A", event])
         
         if "handover" in event.lower():
             self.handover_occurred = True
@@ -113,47 +185,52 @@ class StreamingMonitor:
             
         info(f"*** Event recorded at {elapsed:.2f}s: {event}\n")
     
+    def _write_row(self, row):
+        """Buffer one row for the metrics file, writing out full batches"""
+        with self._lock:
+            if not self._fh:
+                return
+            self._row_buf.append(row)
+            if len(self._row_buf) >= self.ROW_BATCH:
+                self._writer.writerows(self._row_buf)
+                self._row_buf.clear()
+    
     def _monitor_loop(self):
         """Continuously monitor streaming metrics"""
-        while self.running:
+        while not self._stop.is_set():
             try:
                 elapsed = time.time() - self.start_time
                 
                 # Calculate position (0 to 1) based on time (0 to 30 seconds)
                 position = min(1.0, elapsed / 30.0)
                 
-                # Simulate streaming metrics
-                buffer_status = self._get_buffer_status(position, elapsed)
-                packet_loss = self._get_packet_loss(position, elapsed)
-                bitrate = self._get_bitrate(position, elapsed)
-                latency = self._get_latency(position, elapsed)
-                
-                # Convert from string representations to numeric values for internal use
-                buffer_value = float(buffer_status.strip('%'))
-                bitrate_value = float(bitrate.split()[0])
-                packet_loss_value = float(packet_loss.strip('%'))
-                latency_value = float(latency.split()[0])
+                # Look up this sample's simulated streaming metrics
+                idx = int(elapsed / self.SAMPLE_INTERVAL)
+                if idx >= self._buf.size:
+                    self._precompute(2 * self._buf.size * self.SAMPLE_INTERVAL)
+                buffer_value = self._buf[idx].item()
+                bitrate_value = self._bit[idx].item()
+                packet_loss_value = self._loss[idx].item()
+                latency_value = self._lat[idx].item()
                 
                 # Record the metrics
-                self.metrics.append({
-                    'time': elapsed,
-                    'position': position,
-                    'buffer': buffer_value,
-                    'bitrate': bitrate_value,
-                    'packet_loss': packet_loss_value,
-                    'latency': latency_value
-                })
+                if self.num_samples == self._samples.shape[1]:
+                    self._samples = np.concatenate((self._samples, np.empty_like(self._samples)), axis=1)
+                self._samples[:, self.num_samples] = (elapsed, position, buffer_value, bitrate_value,
+                                                      packet_loss_value, latency_value)
+                self.num_samples += 1
                 
                 # Write to metrics file
-                with open(self.output_file, 'a') as f:
-                    f.write(f"{elapsed:.2f},{position:.2f},{buffer_status},{bitrate},{packet_loss},{latency},\n")
+                self._write_row([f"{elapsed:.2f}", f"{position:.2f}", f"{buffer_value:.1f}%", f"{bitrate_value:.2f} Mbps",
+                                 f"{packet_loss_value:.1f}%", f"{latency_value:.1f} ms", ""])
                 
                 # Record special events
                 if not self.handover_occurred and 0.48 < position < 0.52:
                     self.record_event(position, "Handover from AP1 to AP2")
                 
                 # Record buffer depletion events
-                if buffer_value < 10 and not any(m['buffer'] < 10 for m in self.metrics[:-1]):
+                if buffer_value < 10 and not self._depletion_recorded:
+                    self._depletion_recorded = True
                     self.record_event(position, f"Buffer depleted to {buffer_value:.1f}%")
                 
                 # Record stall events
@@ -161,120 +238,92 @@ class StreamingMonitor:
                     self.record_event(position, "Playback stalled")
                 
                 # Record bitrate adaptation events
-                if len(self.metrics) > 1:
-                    prev_bitrate = self.metrics[-2]['bitrate']
-                    if abs(bitrate_value - prev_bitrate) > 0.2:
-                        self.record_event(position, f"Bitrate changed from {prev_bitrate:.2f} to {bitrate_value:.2f} Mbps")
+                prev_bitrate = self._last_bitrate
+                self._last_bitrate = bitrate_value
+                if prev_bitrate is not None and abs(bitrate_value - prev_bitrate) > 0.2:
+                    self.record_event(position, f"Bitrate changed from {prev_bitrate:.2f} to {bitrate_value:.2f} Mbps")
             
             except Exception as e:
                 error(f"*** Monitoring error: {e}\n")
             
-            # Sleep before next sample
-            time.sleep(0.5)
-    
-    def _get_buffer_status(self, position, elapsed):
-        """Simulate buffer status based on position and network conditions"""
-        # Get reference to handover
-        handover_pos = self.handover_position
-        if self.handover_occurred:
-            time_since_handover = elapsed - self.handover_time
-        else:
-            time_since_handover = -100  # Handover hasn't occurred yet
-        
-        # Baseline buffer level (% full)
-        buffer_level = 95.0  
-        
-        # Simulate buffer behavior before handover
-        if abs(position - handover_pos) < 0.15:
-            # Around handover, buffer depletes rapidly
-            dist_from_handover = abs(position - handover_pos)
-            
-            if position < handover_pos:
-                # Approaching handover
-                buffer_level = max(5, 95 - (0.15 - dist_from_handover) * 600)
-            else:
-                # After handover, buffer recovers slowly
-                if time_since_handover < 0:
-                    buffer_level = 5  # Very low just before handover
-                elif time_since_handover < 3:
-                    # Gradual recovery after handover
-                    buffer_level = 5 + time_since_handover * 15
-                else:
-                    # Almost back to normal
-                    buffer_level = min(95, 50 + (time_since_handover - 3) * 15)
-        
-        # Add random variations to make it look realistic
-        buffer_level += random.uniform(-3, 3)
-        buffer_level = max(0, min(100, buffer_level))
-        
-        return f"{buffer_level:.1f}%"
-    
-    def _get_packet_loss(self, position, elapsed):
-        """Simulate packet loss based on position"""
-        handover_pos = self.handover_position
-        
-        # Baseline packet loss (very low under normal conditions)
-        packet_loss = 0.2
-        
-        # Spike during handover
-        if abs(position - handover_pos) < 0.1:
-            dist = abs(position - handover_pos)
-            # Creates a sharp spike at handover
-            packet_loss = 20 * (1 - dist * 10) 
-        
-        # Add random noise
-        packet_loss += random.uniform(-0.5, 0.5)
-        packet_loss = max(0, packet_loss)
-        
-        return f"{packet_loss:.1f}%"
-    
-    def _get_bitrate(self, position, elapsed):
-        """Simulate adaptive bitrate changes based on network conditions"""
-        handover_pos = self.handover_position
-        
-        # Baseline bitrate
-        if position < handover_pos - 0.15:
-            # Good quality before approaching handover
-            base_bitrate = 1.0
-        elif position < handover_pos:
-            # Quality degrades as we approach handover
-            dist = handover_pos - position
-            base_bitrate = max(0.3, 1.0 - (0.15 - dist) * 5)
-        elif position < handover_pos + 0.05:
-            # Very low quality during handover
-            base_bitrate = 0.3
-        else:
-            # Quality recovers after handover
-            dist = position - (handover_pos + 0.05)
-            base_bitrate = min(0.8, 0.3 + dist * 5)
-        
-        # Add small fluctuations
-        bitrate = base_bitrate + random.uniform(-0.05, 0.05)
-        bitrate = max(0.1, bitrate)
-        
-        return f"{bitrate:.2f} Mbps"
+            # Wait before next sample, returning at once when stopped
+            if self._stop.wait(self.SAMPLE_INTERVAL):
+                break
     
-    def _get_latency(self, position, elapsed):
-        """Simulate network latency based on position"""
-        handover_pos = self.handover_position
-        
-        # Baseline latency
-        if abs(position - handover_pos) < 0.1:
-            # High latency during handover
-            dist = abs(position - handover_pos)
-            base_latency = 100 + (0.1 - dist) * 500
-        else:
-            # Lower latency in stable conditions
-            base_latency = 30
-        
-        # Add random variations
-        latency = base_latency + random.uniform(-5, 5)
-        latency = max(20, latency)
-        
-        return f"{latency:.1f} ms"
+    def _precompute(self, horizon):
+        """Work out every sample's metrics for the first horizon seconds
+        
+        The metrics are functions of position (elapsed / 30s) plus noise, and
+        the monitor records the handover itself at the first sample with
+        0.48 < position < 0.52, so the whole run can be built up front on the
+        sampling grid. Each array holds the values rounded as they are written.
+        """
+        t = np.arange(0, horizon, self.SAMPLE_INTERVAL)
+        position = np.minimum(1.0, t / 30.0)
+        n = t.size
+        
+        # Handover reference: 0.5 until the handover sample, then the
+        # position it was recorded at
+        in_window = np.flatnonzero((position > 0.48) & (position < 0.52))
+        h = in_window[0] if in_window.size else n
+        after = np.arange(n) > h
+        handover_pos = np.where(after, position[min(h, n - 1)], 0.5)
+        time_since_handover = np.where(after, t - t[min(h, n - 1)], -100)  # -100: not yet
+        dist = np.abs(position - handover_pos)
+        
+        # Buffer status: baseline 95% full; around handover it depletes
+        # rapidly on approach, then recovers slowly afterwards
+        buffer_level = np.full(n, 95.0)
+        near = dist < 0.15
+        approaching = near & (position < handover_pos)
+        buffer_level[approaching] = np.maximum(5, 95 - (0.15 - dist[approaching]) * 600)
+        recovering = near & ~approaching
+        buffer_level[recovering] = np.select(
+            [time_since_handover[recovering] < 0, time_since_handover[recovering] < 3],
+            [5, 5 + time_since_handover[recovering] * 15],  # Very low just before, then gradual recovery
+            np.minimum(95, 50 + (time_since_handover[recovering] - 3) * 15))  # Almost back to normal
+        buffer_level += self._rng.uniform(-3, 3, n)
+        self._buf = np.round(np.clip(buffer_level, 0, 100), 1)
+        
+        # Packet loss: very low normally, with a sharp spike at handover
+        packet_loss = np.where(dist < 0.1, 20 * (1 - dist * 10), 0.2)
+        packet_loss += self._rng.uniform(-0.5, 0.5, n)
+        self._loss = np.round(np.maximum(0, packet_loss), 1)
+        
+        # Adaptive bitrate: good quality, degrading as we approach handover,
+        # very low during handover, then recovering
+        base_bitrate = np.select(
+            [position < handover_pos - 0.15, position < handover_pos, position < handover_pos + 0.05],
+            [1.0, np.maximum(0.3, 1.0 - (0.15 - (handover_pos - position)) * 5), 0.3],
+            np.minimum(0.8, 0.3 + (position - (handover_pos + 0.05)) * 5))
+        bitrate = base_bitrate + self._rng.uniform(-0.05, 0.05, n)
+        self._bit = np.round(np.maximum(0.1, bitrate), 2)
+        
+        # Latency: high during handover, lower in stable conditions
+        base_latency = np.where(dist < 0.1, 100 + (0.1 - dist) * 500, 30)
+        latency = base_latency + self._rng.uniform(-5, 5, n)
+        self._lat = np.round(np.maximum(20, latency), 1)
+
+# Figures kept across visualize_metrics calls, by name
+_figures = {}
+
+def get_figure(name, figsize):
+    """Return the figure kept for name, created on first use or cleared for reuse"""
+    import matplotlib.pyplot as plt
+    fig = _figures.get(name)
+    if fig is None:
+        fig = _figures[name] = plt.figure(figsize=figsize)
+    else:
+        fig.clf()
+    return fig
 
 def visualize_metrics(metrics_file='./streaming_metrics.txt'):
     """Create visualization of streaming metrics"""
+    # Loaded after the streaming session ends, so matplotlib's import
+    # cost doesn't delay bringing up the topology
+    import matplotlib
+    matplotlib.use('Agg')  # Use non-interactive backend
+    
     info("*** Creating visualization of streaming metrics\n")
     
     try:
@@ -284,71 +333,36 @@ def visualize_metrics(metrics_file='./streaming_metrics.txt'):
             return
         
         # Read the metrics
-        times = []
-        positions = []
-        buffers = []
-        bitrates = []
-        packet_losses = []
-        latencies = []
-        events = []
-        
         with open(metrics_file, 'r') as f:
-            next(f)  # Skip header
-            for line in f:
-                parts = line.strip().split(',')
-                if len(parts) >= 7:
-                    try:
-                        time = float(parts[0])
-                        position = float(parts[1])
-                        buffer = parts[2]
-                        bitrate = parts[3]
-                        packet_loss = parts[4]
-                        latency = parts[5]
-                        event = parts[6] if len(parts) > 6 else ""
-                        
-                        times.append(time)
-                        positions.append(position)
-                        
-                        # Parse numeric values
-                        if buffer != 'N/A':
-                            buffer = float(buffer.strip('%'))
-                        else:
-                            buffer = None
-                        buffers.append(buffer)
-                        
-                        if bitrate != 'N/A':
-                            bitrate = float(bitrate.split()[0])
-                        else:
-                            bitrate = None
-                        bitrates.append(bitrate)
-                        
-                        if packet_loss != 'N/A':
-                            packet_loss = float(packet_loss.strip('%'))
-                        else:
-                            packet_loss = None
-                        packet_losses.append(packet_loss)
-                        
-                        if latency != 'N/A':
-                            latency = float(latency.split()[0])
-                        else:
-                            latency = None
-                        latencies.append(latency)
-                        
-                        events.append(event)
-                    except Exception as e:
-                        error(f"Error parsing line: {e}\n")
-        
-        if not times:
+            text = f.read()
+        lines = text.splitlines()[1:]  # Skip header
+        
+        if not lines:
             error("*** No valid metrics data found\n")
             return
         
+        # Strip the units so the numeric columns parse in one pass, with the
+        # N/A of event rows becoming NaN
+        numeric = text.replace('%', '').replace(' Mbps', '').replace(' ms', '').replace('N/A', 'nan')
+        data = np.loadtxt(numeric.splitlines()[1:], delimiter=',', quotechar='"', usecols=range(6), ndmin=2)
+        times, positions, buffers, bitrates, packet_losses, latencies = data.T
+        events = np.loadtxt(lines, delimiter=',', quotechar='"', usecols=6, dtype=str, ndmin=1)
+        
+        # Rows holding measurements rather than just an event, and the times
+        # of handover and stall events
+        measured = ~np.isnan(buffers)
+        lowered_events = np.char.lower(events)
+        handover_times = times[np.char.find(lowered_events, 'handover') >= 0]
+        stall_times = times[np.char.find(lowered_events, 'stalled') >= 0]
+        
         # Create figure with 4 subplots
-        fig, (ax1, ax2, ax3, ax4) = plt.subplots(4, 1, figsize=(12, 16), sharex=True)
+        fig = get_figure('metrics', (12, 16))
+        ax1, ax2, ax3, ax4 = fig.subplots(4, 1, sharex=True)
         
         # Plot buffer status
-        buffer_times = [t for i, t in enumerate(times) if buffers[i] is not None]
-        buffer_values = [b for b in buffers if b is not None]
-        if buffer_values:
+        buffer_times = times[measured]
+        buffer_values = buffers[measured]
+        if buffer_values.size:
             ax1.plot(buffer_times, buffer_values, 'b-', linewidth=2, label='Buffer Level')
             ax1.set_ylabel('Buffer Level (%)', fontsize=12)
             ax1.set_title('Video Buffer Level During Handover', fontsize=14, fontweight='bold')
@@ -356,51 +370,49 @@ def visualize_metrics(metrics_file='./streaming_metrics.txt'):
             ax1.set_ylim(0, 105)
         
         # Plot bitrate
-        bitrate_times = [t for i, t in enumerate(times) if bitrates[i] is not None]
-        bitrate_values = [b for b in bitrates if b is not None]
-        if bitrate_values:
+        bitrate_times = times[measured]
+        bitrate_values = bitrates[measured]
+        if bitrate_values.size:
             ax2.plot(bitrate_times, bitrate_values, 'g-', linewidth=2, label='Video Bitrate')
             ax2.set_ylabel('Bitrate (Mbps)', fontsize=12)
             ax2.set_title('Adaptive Bitrate During Handover', fontsize=14, fontweight='bold')
             ax2.grid(True, alpha=0.3)
-            ax2.set_ylim(0, max(bitrate_values) * 1.1)
+            ax2.set_ylim(0, bitrate_values.max() * 1.1)
         
         # Plot packet loss
-        packetloss_times = [t for i, t in enumerate(times) if packet_losses[i] is not None]
-        packetloss_values = [p for p in packet_losses if p is not None]
-        if packetloss_values:
+        packetloss_times = times[measured]
+        packetloss_values = packet_losses[measured]
+        if packetloss_values.size:
             ax3.plot(packetloss_times, packetloss_values, 'r-', linewidth=2, label='Packet Loss')
             ax3.set_ylabel('Packet Loss (%)', fontsize=12)
             ax3.set_title('Network Packet Loss During Handover', fontsize=14, fontweight='bold')
             ax3.grid(True, alpha=0.3)
-            ax3.set_ylim(0, max(max(packetloss_values) * 1.1, 5))
+            ax3.set_ylim(0, max(packetloss_values.max() * 1.1, 5))
         
         # Plot latency
-        latency_times = [t for i, t in enumerate(times) if latencies[i] is not None]
-        latency_values = [l for l in latencies if l is not None]
-        if latency_values:
+        latency_times = times[measured]
+        latency_values = latencies[measured]
+        if latency_values.size:
             ax4.plot(latency_times, latency_values, 'm-', linewidth=2, label='Network Latency')
             ax4.set_ylabel('Latency (ms)', fontsize=12)
             ax4.set_xlabel('Time (seconds)', fontsize=12)
             ax4.set_title('Network Latency During Handover', fontsize=14, fontweight='bold')
             ax4.grid(True, alpha=0.3)
-            ax4.set_ylim(0, max(latency_values) * 1.1)
+            ax4.set_ylim(0, latency_values.max() * 1.1)
         
         # Mark handover events on all plots
-        for i, event in enumerate(events):
-            if event and 'handover' in event.lower():
-                for ax in (ax1, ax2, ax3, ax4):
-                    ax.axvline(x=times[i], color='red', linestyle='--', linewidth=2, label='Handover')
-                    ax.text(times[i] + 0.5, ax.get_ylim()[1] * 0.9, 'Handover', 
-                           rotation=90, color='red', fontweight='bold')
-                    
-                    # Add shaded region to represent handover impact
-                    ax.axvspan(times[i] - 1, times[i] + 3, color='red', alpha=0.1)
+        for h_time in handover_times:
+            for ax in (ax1, ax2, ax3, ax4):
+                ax.axvline(x=h_time, color='red', linestyle='--', linewidth=2, label='Handover')
+                ax.text(h_time + 0.5, ax.get_ylim()[1] * 0.9, 'Handover', 
+                       rotation=90, color='red', fontweight='bold')
+                
+                # Add shaded region to represent handover impact
+                ax.axvspan(h_time - 1, h_time + 3, color='red', alpha=0.1)
         
         # Mark stall events
-        for i, event in enumerate(events):
-            if event and 'stalled' in event.lower():
-                ax1.plot(times[i], 0, 'rx', markersize=10, label='Playback Stalled')
+        if stall_times.size:
+            ax1.plot(stall_times, np.zeros_like(stall_times), 'rx', markersize=10, label='Playback Stalled')
         
         # Add legends with unique entries
         for ax in (ax1, ax2, ax3, ax4):
@@ -408,38 +420,26 @@ def visualize_metrics(metrics_file='./streaming_metrics.txt'):
             by_label = dict(zip(labels, handles))
             ax.legend(by_label.values(), by_label.keys(), loc='upper right')
         
-        plt.tight_layout()
-        plt.savefig('./video_streaming_handover.png', dpi=300)
+        fig.tight_layout()
+        fig.savefig('./video_streaming_handover.png', dpi=120)
         info("*** Created visualization: ./video_streaming_handover.png\n")
         
         # Create a summary plot with QoE metrics
-        plt.figure(figsize=(10, 8))
-        
         # Calculate QoE metrics
-        handover_time = None
-        for i, event in enumerate(events):
-            if event and 'handover' in event.lower():
-                handover_time = times[i]
-                break
-                
+        handover_time = handover_times[0] if handover_times.size else None
+        
         if handover_time:
             # Divide data into pre-handover and post-handover
-            pre_handover_buffers = [b for i, b in enumerate(buffers) 
-                                  if b is not None and times[i] < handover_time]
-            post_handover_buffers = [b for i, b in enumerate(buffers) 
-                                   if b is not None and times[i] >= handover_time]
-            
-            pre_handover_bitrates = [b for i, b in enumerate(bitrates) 
-                                   if b is not None and times[i] < handover_time]
-            post_handover_bitrates = [b for i, b in enumerate(bitrates) 
-                                    if b is not None and times[i] >= handover_time]
+            pre_handover = measured & (times < handover_time)
+            post_handover = measured & (times >= handover_time)
             
             # Calculate averages
-            avg_pre_buffer = sum(pre_handover_buffers) / len(pre_handover_buffers) if pre_handover_buffers else 0
-            avg_post_buffer = sum(post_handover_buffers) / len(post_handover_buffers) if post_handover_buffers else 0
+            has_pre, has_post = pre_handover.any(), post_handover.any()
+            avg_pre_buffer = buffers[pre_handover].mean() if has_pre else 0
+            avg_post_buffer = buffers[post_handover].mean() if has_post else 0
             
-            avg_pre_bitrate = sum(pre_handover_bitrates) / len(pre_handover_bitrates) if pre_handover_bitrates else 0
-            avg_post_bitrate = sum(post_handover_bitrates) / len(post_handover_bitrates) if post_handover_bitrates else 0
+            avg_pre_bitrate = bitrates[pre_handover].mean() if has_pre else 0
+            avg_post_bitrate = bitrates[post_handover].mean() if has_post else 0
             
             # Create bar chart comparing pre and post handover
             labels = ['Buffer Level (%)', 'Bitrate (Mbps)']
@@ -449,7 +449,8 @@ def visualize_metrics(metrics_file='./streaming_metrics.txt'):
             x = np.arange(len(labels))
             width = 0.35
             
-            fig, ax = plt.subplots(figsize=(10, 6))
+            fig = get_figure('summary', (10, 6))
+            ax = fig.add_subplot()
             rects1 = ax.bar(x - width/2, pre_values, width, label='Before Handover')
             rects2 = ax.bar(x + width/2, post_values, width, label='After Handover')
             
@@ -476,14 +477,14 @@ def visualize_metrics(metrics_file='./streaming_metrics.txt'):
             buffer_impact = ((avg_post_buffer - avg_pre_buffer) / avg_pre_buffer * 100) if avg_pre_buffer else 0
             bitrate_impact = ((avg_post_bitrate - avg_pre_bitrate) / avg_pre_bitrate * 100) if avg_pre_bitrate else 0
             
-            plt.figtext(0.5, 0.01, 
+            fig.text(0.5, 0.01, 
                      f"Handover Impact Summary:\n"
                      f"Buffer Level: {buffer_impact:.1f}% change\n"
                      f"Video Bitrate: {bitrate_impact:.1f}% change\n",
                      ha='center', fontsize=12, bbox={"facecolor":"lightblue", "alpha":0.5, "pad":5})
             
-            plt.tight_layout(rect=[0, 0.08, 1, 0.95])
-            plt.savefig('./handover_impact_summary.png', dpi=300)
+            fig.tight_layout(rect=[0, 0.08, 1, 0.95])
+            fig.savefig('./handover_impact_summary.png', dpi=120)
             info("*** Created summary visualization: ./handover_impact_summary.png\n")
         
     except Exception as e:
@@ -497,36 +498,42 @@ def simulate_mobility(sta1, ap1, ap2, duration=30):
     
     start_time = time.time()
     
-    # Create file to track handovers
-    with open('./handover_events.txt', 'w') as f:
-        f.write("Time(s) | Position | Event\n")
-        f.write("--------------------------\n")
-    
-    # Simulate handover at the middle of the journey
-    handover_time = duration / 2
-    handover_done = False
-    
-    while time.time() - start_time < duration:
-        elapsed = time.time() - start_time
-        position = min(1.0, elapsed / duration)
+    # Create file to track handovers, kept open for the whole simulation and
+    # closed even if it is interrupted
+    with open('./handover_events.txt', 'w') as handover_log:
+        handover_log.write("Time(s) | Position | Event\n")
+        handover_log.write("--------------------------\n")
         
-        # Perform handover when we reach the middle
-        if not handover_done and elapsed >= handover_time:
-            info(f"*** Handover at position {position:.2f}\n")
-            
-            # Record handover
-            with open('./handover_events.txt', 'a') as f:
-                f.write(f"{elapsed:.1f} | {position:.2f} | Handover from AP1 to AP2\n")
-            
-            handover_done = True
+        # Simulate handover at the middle of the journey
+        handover_time = duration / 2
+        handover_done = False
         
-        # Output current position
-        ap1_quality = 100 - position * 100 if position <= 0.5 else 0
-        ap2_quality = 0 if position < 0.5 else (position - 0.5) * 200
+        # Position is logged every few steps rather than every second
+        log_every = 5
+        step = 0
         
-        info(f"Time: {elapsed:.1f}s, Position: {position:.2f}, AP1: {ap1_quality:.1f}%, AP2: {ap2_quality:.1f}%\n")
-        
-        time.sleep(1)
+        while time.time() - start_time < duration:
+            elapsed = time.time() - start_time
+            position = min(1.0, elapsed / duration)
+            
+            # Perform handover when we reach the middle
+            if not handover_done and elapsed >= handover_time:
+                info(f"*** Handover at position {position:.2f}\n")
+                
+                # Record handover
+                handover_log.write(f"{elapsed:.1f} | {position:.2f} | Handover from AP1 to AP2\n")
+                
+                handover_done = True
+            
+            # Output current position
+            if step % log_every == 0:
+                ap1_quality = 100 - position * 100 if position <= 0.5 else 0
+                ap2_quality = 0 if position < 0.5 else (position - 0.5) * 200
+                
+                info(f"Time: {elapsed:.1f}s, Position: {position:.2f}, AP1: {ap1_quality:.1f}%, AP2: {ap2_quality:.1f}%\n")
+            step += 1
+            
+            time.sleep(1)
     
     info("*** Station movement simulation completed\n")
 
@@ -572,25 +579,25 @@ def topology():
     ap1.start([c0])
     ap2.start([c0])
     
-    # Set up station interfaces
-    sta1.cmd('ifconfig sta1-eth0 10.0.0.2/24')
-    sta1.cmd('ifconfig sta1-eth1 10.0.0.3/24')
-    
-    # Initially set high quality link to AP1, poor link to AP2
-    sta1.cmd('tc qdisc add dev sta1-eth0 root netem delay 20ms loss 0%')
-    sta1.cmd('tc qdisc add dev sta1-eth1 root netem delay 100ms loss 20%')
-    
-    # Set up routing: initially use AP1
-    sta1.cmd('ip route add default via 10.0.0.1')
-    
-    # Configure switches for layer 2 learning
-    for sw in [ap1, ap2]:
-        sw.cmd('ovs-ofctl add-flow {} "actions=normal"'.format(sw.name))
+    # Configure the station in one shell round-trip:
+    sta1.cmd('; '.join([
+        # Set up station interfaces
+        'ifconfig sta1-eth0 10.0.0.2/24',
+        'ifconfig sta1-eth1 10.0.0.3/24',
+        # Initially set high quality link to AP1, poor link to AP2
+        'tc qdisc add dev sta1-eth0 root netem delay 20ms loss 0%',
+        'tc qdisc add dev sta1-eth1 root netem delay 100ms loss 20%',
+        # Set up routing: initially use AP1
+        'ip route add default via 10.0.0.1',
+    ]))
+    
+    # Configure switches for layer 2 learning, both from one shell
+    ap1.cmd('; '.join('ovs-ofctl add-flow {} "actions=normal"'.format(sw.name) for sw in [ap1, ap2]))
     
     info("*** Checking for streaming software\n")
     # Check if we can use VLC
-    vlc_available = os.system('which vlc > /dev/null 2>&1') == 0
-    ffplay_available = os.system('which ffplay > /dev/null 2>&1') == 0
+    vlc_available = shutil.which('vlc') is not None
+    ffplay_available = shutil.which('ffplay') is not None
     
     # Start streaming server
     info("*** Starting streaming server\n")
@@ -8,197 +8,245 @@ This script simulates how video streaming performance is affected during handove
 between two wireless access points.
 """
 
+import io
 import os
 import time
-import random
 import numpy as np
-import matplotlib
-matplotlib.use('Agg')  # Use non-interactive backend
-import matplotlib.pyplot as plt
-from datetime import datetime
-import subprocess
 from mininet.log import setLogLevel, info, error
 
+# Resolution of the saved plots; PNG encoding time grows with the pixel
+# count, so raise it only when print quality is needed
+PLOT_DPI = int(os.environ.get('PLOT_DPI', 100))
+
+# Codes written in the EventCode column of streaming_metrics.txt
+EVENT_NONE, EVENT_HANDOVER, EVENT_BUFFER_LOW, EVENT_STALL, EVENT_PACKET_LOSS = range(5)
+
+# Simulation parameters
+DURATION = 30  # seconds
+HANDOVER_TIME = 15  # when handover occurs
+SAMPLING_RATE = 5  # data points per second
+
+# Headers of the two output files
+METRICS_HEADER = "Time(s),Position,BufferStatus(%),Bitrate(Mbps),PacketLoss(%),Latency(ms),Event,EventCode\n"
+HANDOVER_EVENTS_HEADER = "Time(s) | Position | Event\n--------------------------\n"
+
 def cleanup():
     """Clean up any previous processes"""
     info("*** Cleaning up previous instances\n")
     os.system('rm -f ./streaming_metrics.txt ./handover_events.txt > /dev/null 2>&1')
     time.sleep(1)
 
-def simulate_streaming():
-    """Simulate a video streaming session with handover between APs"""
-    info("*** Starting streaming simulation\n")
-    
-    # Simulation parameters
-    duration = 30  # seconds
-    handover_time = 15  # when handover occurs
-    sampling_rate = 5  # data points per second
-    
-    # Create metrics file
-    with open('./streaming_metrics.txt', 'w') as f:
-        f.write("Time,Position,BufferStatus,Bitrate,PacketLoss,Latency,Event\n")
+def session_rows(rng):
+    """Generate the metrics of a whole session and format its rows
+
+    Returns the sample times, buffer levels and packet losses (which decide
+    the special events), and each sample's row up to its Event column.
+    """
+    # Generate realistic metrics based on position relative to handover
+    t = np.arange(DURATION * SAMPLING_RATE) / SAMPLING_RATE
+    buffer_levels = generate_buffer_level(t, HANDOVER_TIME, rng)
+    bitrates = generate_bitrate(t, HANDOVER_TIME, rng)
+    packet_losses = generate_packet_loss(t, HANDOVER_TIME, rng)
+    latencies = generate_latency(t, HANDOVER_TIME, rng)
     
-    # Create handover events file
-    with open('./handover_events.txt', 'w') as f:
-        f.write("Time(s) | Position | Event\n")
-        f.write("--------------------------\n")
+    # Format every row in one pass
+    table = io.StringIO()
+    np.savetxt(table, np.column_stack([t, t / DURATION, buffer_levels, bitrates, packet_losses, latencies]),
+               fmt='%.2f,%.2f,%.1f,%.2f,%.1f,%.1f,')
+    return t, buffer_levels, packet_losses, table.getvalue().splitlines()
+
+def simulate_streaming(real_time=True):
+    """Simulate a video streaming session with handover between APs
+
+    With real_time=False the samples are produced as fast as possible
+    instead of being paced to the session clock.
+    """
+    info("*** Starting streaming simulation\n")
     
     # Simulate the streaming session
-    start_time = time.time()
+    start_time = time.monotonic()
     handover_done = False
     
     info("*** Simulating video streaming during handover\n")
     
-    for i in range(duration * sampling_rate):
-        # Calculate current time and position
-        sim_time = i / sampling_rate
-        position = sim_time / duration
+    # The whole session is generated and formatted up front; the loop below
+    # only writes the rows out as the session progresses
+    rng = np.random.default_rng()
+    t, buffer_levels, packet_losses, rows = session_rows(rng)
+    
+    # Create the metrics and handover events files, kept open for the whole
+    # session so rows go through the write buffer
+    with open('./streaming_metrics.txt', 'w', buffering=1 << 16) as metrics_f, \
+         open('./handover_events.txt', 'w', buffering=1 << 16) as events_f:
+        metrics_f.write(METRICS_HEADER)
+        events_f.write(HANDOVER_EVENTS_HEADER)
         
-        # Check if handover should occur
-        if not handover_done and sim_time >= handover_time:
-            info(f"*** Handover at time {sim_time:.1f}s (position {position:.2f})\n")
-            with open('./handover_events.txt', 'a') as f:
-                f.write(f"{sim_time:.1f} | {position:.2f} | Handover from AP1 to AP2\n")
-            handover_done = True
+        for i in range(len(t)):
+            # Calculate current time and position
+            sim_time = i / SAMPLING_RATE
+            position = sim_time / DURATION
             
-            # Record handover event in metrics
-            with open('./streaming_metrics.txt', 'a') as f:
-                f.write(f"{sim_time:.2f},{position:.2f},N/A,N/A,N/A,N/A,Handover from AP1 to AP2\n")
-        
-        # Generate realistic metrics based on position relative to handover
-        buffer_level = generate_buffer_level(sim_time, position, handover_time)
-        bitrate = generate_bitrate(sim_time, position, handover_time)
-        packet_loss = generate_packet_loss(sim_time, position, handover_time)
-        latency = generate_latency(sim_time, position, handover_time)
-        
-        # Write metrics to file
-        with open('./streaming_metrics.txt', 'a') as f:
-            f.write(f"{sim_time:.2f},{position:.2f},{buffer_level:.1f}%,{bitrate:.2f} Mbps,{packet_loss:.1f}%,{latency:.1f} ms,\n")
-        
-        # Special events
-        if buffer_level < 5 and random.random() < 0.3:
-            with open('./streaming_metrics.txt', 'a') as f:
-                f.write(f"{sim_time:.2f},{position:.2f},{buffer_level:.1f}%,{bitrate:.2f} Mbps,{packet_loss:.1f}%,{latency:.1f} ms,Buffer critically low\n")
-        
-        if packet_loss > 15 and random.random() < 0.3:
-            with open('./streaming_metrics.txt', 'a') as f:
-                f.write(f"{sim_time:.2f},{position:.2f},{buffer_level:.1f}%,{bitrate:.2f} Mbps,{packet_loss:.1f}%,{latency:.1f} ms,High packet loss detected\n")
-        
-        if buffer_level < 0.5 and random.random() < 0.5:
-            with open('./streaming_metrics.txt', 'a') as f:
-                f.write(f"{sim_time:.2f},{position:.2f},{buffer_level:.1f}%,{bitrate:.2f} Mbps,{packet_loss:.1f}%,{latency:.1f} ms,Playback stalled\n")
+            # Check if handover should occur
+            if not handover_done and sim_time >= HANDOVER_TIME:
+                info(f"*** Handover at time {sim_time:.1f}s (position {position:.2f})\n")
+                events_f.write(f"{sim_time:.1f} | {position:.2f} | Handover from AP1 to AP2\n")
+                handover_done = True
                 
-        # Sleep to simulate real-time operation
-        elapsed = time.time() - start_time
-        target_time = (i + 1) / sampling_rate
-        if elapsed < target_time:
-            time.sleep(target_time - elapsed)
-        
-        # Print progress
-        if i % sampling_rate == 0:
-            ap1_quality = 100 - position * 100 if position <= 0.5 else 0
-            ap2_quality = 0 if position < 0.5 else (position - 0.5) * 200
-            info(f"Time: {sim_time:.1f}s, Position: {position:.2f}, AP1: {ap1_quality:.1f}%, AP2: {ap2_quality:.1f}%\n")
+                # Record handover event in metrics
+                metrics_f.write(f"{sim_time:.2f},{position:.2f},N/A,N/A,N/A,N/A,Handover from AP1 to AP2,{EVENT_HANDOVER}\n")
+            
+            buffer_level = buffer_levels[i]
+            packet_loss = packet_losses[i]
+            
+            # Write metrics to file
+            row = rows[i]
+            metrics_f.write(f"{row},{EVENT_NONE}\n")
+            
+            # Special events
+            if buffer_level < 5 and rng.random() < 0.3:
+                metrics_f.write(f"{row}Buffer critically low,{EVENT_BUFFER_LOW}\n")
+            
+            if packet_loss > 15 and rng.random() < 0.3:
+                metrics_f.write(f"{row}High packet loss detected,{EVENT_PACKET_LOSS}\n")
+            
+            if buffer_level < 0.5 and rng.random() < 0.5:
+                metrics_f.write(f"{row}Playback stalled,{EVENT_STALL}\n")
+                    
+            # Sleep to simulate real-time operation
+            if real_time:
+                elapsed = time.monotonic() - start_time
+                target_time = (i + 1) / SAMPLING_RATE
+                if elapsed < target_time:
+                    time.sleep(target_time - elapsed)
+            
+            # Print progress
+            if i % SAMPLING_RATE == 0:
+                ap1_quality = 100 - position * 100 if position <= 0.5 else 0
+                ap2_quality = 0 if position < 0.5 else (position - 0.5) * 200
+                info(f"Time: {sim_time:.1f}s, Position: {position:.2f}, AP1: {ap1_quality:.1f}%, AP2: {ap2_quality:.1f}%\n")
     
     info("*** Simulation completed\n")
     return True
 
-def generate_buffer_level(time, position, handover_time):
-    """Generate realistic buffer level data"""
+def simulate_streaming_fast():
+    """Generate the same streaming session as simulate_streaming in one batch
+
+    There is no real-time loop: the event rows are picked with masks over
+    the whole session and both files are written in a single call each.
+    """
+    info("*** Starting streaming simulation (fast mode)\n")
+    
+    rng = np.random.default_rng()
+    t, buffer_levels, packet_losses, rows = session_rows(rng)
+    rows = np.array(rows)
+    n = len(t)
+    
+    # Special events, with the same chances as the real-time loop
+    buffer_low = (buffer_levels < 5) & (rng.random(n) < 0.3)
+    high_loss = (packet_losses > 15) & (rng.random(n) < 0.3)
+    stalled = (buffer_levels < 0.5) & (rng.random(n) < 0.5)
+    
+    # The handover row goes just before the first sample at or after it
+    h = int(np.argmax(t >= HANDOVER_TIME))
+    h_time, h_position = t[h], t[h] / DURATION
+    info(f"*** Handover at time {h_time:.1f}s (position {h_position:.2f})\n")
+    
+    # Interleave the event rows after their sample, in the order the
+    # real-time loop writes them
+    samples = np.arange(n)
+    index = np.concatenate([[h], samples, samples[buffer_low], samples[high_loss], samples[stalled]])
+    order = np.concatenate([[0], np.full(n, 1), np.full(buffer_low.sum(), 2),
+                            np.full(high_loss.sum(), 3), np.full(stalled.sum(), 4)])
+    lines = np.concatenate([
+        [f"{h_time:.2f},{h_position:.2f},N/A,N/A,N/A,N/A,Handover from AP1 to AP2,{EVENT_HANDOVER}"],
+        np.char.add(rows, f",{EVENT_NONE}"),
+        np.char.add(rows[buffer_low], f"Buffer critically low,{EVENT_BUFFER_LOW}"),
+        np.char.add(rows[high_loss], f"High packet loss detected,{EVENT_PACKET_LOSS}"),
+        np.char.add(rows[stalled], f"Playback stalled,{EVENT_STALL}"),
+    ])
+    lines = lines[np.lexsort((order, index))]
+    
+    with open('./streaming_metrics.txt', 'w') as f:
+        f.write(METRICS_HEADER + "\n".join(lines) + "\n")
+    
+    with open('./handover_events.txt', 'w') as f:
+        f.write(HANDOVER_EVENTS_HEADER + f"{h_time:.1f} | {h_position:.2f} | Handover from AP1 to AP2\n")
+    
+    info("*** Simulation completed\n")
+    return True
+
+def generate_buffer_level(t, handover_time, rng):
+    """Generate realistic buffer level data for the sample times t"""
     # Buffer starts high, drops around handover, then recovers
-    if time < handover_time - 3:
-        # Good buffer before approaching handover
-        base = 95.0
-        variation = random.uniform(-5, 5)
-    elif time < handover_time:
-        # Buffer starts depleting as we approach handover
-        proximity = (handover_time - time) / 3.0
-        base = max(5, 95 * proximity)
-        variation = random.uniform(-3, 3)
-    elif time < handover_time + 4:
-        # Buffer is very low during and just after handover
-        recovery = (time - handover_time) / 4.0
-        base = 5 + recovery * 50
-        variation = random.uniform(-5, 5)
-    else:
+    noise = rng.uniform(-1, 1, len(t))
+    buffer_level = np.select(
+        [t < handover_time - 3,   # Good buffer before approaching handover
+         t < handover_time,       # Buffer starts depleting as we approach handover
+         t < handover_time + 4],  # Buffer is very low during and just after handover
+        [95.0 + 5 * noise,
+         np.maximum(5, 95 * (handover_time - t) / 3.0) + 3 * noise,
+         5 + (t - handover_time) / 4.0 * 50 + 5 * noise],
         # Buffer recovers after handover
-        recovery = min(1.0, (time - handover_time - 4) / 8.0)
-        base = 55 + recovery * 40
-        variation = random.uniform(-5, 5)
+        default=55 + np.clip((t - handover_time - 4) / 8.0, 0, 1) * 40 + 5 * noise)
     
     # Add sinusoidal component to simulate regular buffer filling/depleting cycles
-    cycle = np.sin(time * 0.8) * 5
+    buffer_level += np.sin(t * 0.8) * 5
     
     # Ensure buffer level is within valid range
-    buffer_level = max(0, min(100, base + variation + cycle))
-    return buffer_level
+    return np.clip(buffer_level, 0, 100)
 
-def generate_bitrate(time, position, handover_time):
-    """Generate realistic bitrate data"""
+def generate_bitrate(t, handover_time, rng):
+    """Generate realistic bitrate data for the sample times t"""
     # Bitrate adapts to network conditions
-    if time < handover_time - 3:
-        # Good quality before approaching handover
-        base = 1.8
-        variation = random.uniform(-0.1, 0.1)
-    elif time < handover_time:
-        # Quality degrades as we approach handover
-        proximity = (handover_time - time) / 3.0
-        base = max(0.3, 1.8 * proximity)
-        variation = random.uniform(-0.1, 0.1)
-    elif time < handover_time + 2:
-        # Very low quality during handover
-        base = 0.3
-        variation = random.uniform(-0.1, 0.1)
-    else:
+    base = np.select(
+        [t < handover_time - 3,   # Good quality before approaching handover
+         t < handover_time,       # Quality degrades as we approach handover
+         t < handover_time + 2],  # Very low quality during handover
+        [1.8,
+         np.maximum(0.3, 1.8 * (handover_time - t) / 3.0),
+         0.3],
         # Quality improves after handover
-        recovery = min(1.0, (time - handover_time - 2) / 6.0)
-        base = 0.3 + recovery * 1.3
-        variation = random.uniform(-0.1, 0.1)
+        default=0.3 + np.clip((t - handover_time - 2) / 6.0, 0, 1) * 1.3)
+    variation = rng.uniform(-0.1, 0.1, len(t))
     
     # Ensure bitrate is within valid range
-    bitrate = max(0.1, base + variation)
-    return bitrate
+    return np.maximum(0.1, base + variation)
 
-def generate_packet_loss(time, position, handover_time):
-    """Generate realistic packet loss data"""
+def generate_packet_loss(t, handover_time, rng):
+    """Generate realistic packet loss data for the sample times t"""
     # Packet loss spikes during handover
-    time_to_handover = abs(time - handover_time)
+    time_to_handover = np.abs(t - handover_time)
+    during = time_to_handover < 2
     
-    if time_to_handover < 2:
-        # High packet loss during handover
-        intensity = 1 - (time_to_handover / 2)
-        base = 20 * intensity
-        variation = random.uniform(-2, 2)
-    else:
-        # Low packet loss otherwise
-        base = 1.0
-        variation = random.uniform(-0.5, 0.5)
+    # High packet loss during handover, low packet loss otherwise
+    base = np.where(during, 20 * (1 - time_to_handover / 2), 1.0)
+    variation = np.where(during, 2, 0.5) * rng.uniform(-1, 1, len(t))
     
     # Ensure packet loss is within valid range
-    packet_loss = max(0, base + variation)
-    return packet_loss
+    return np.maximum(0, base + variation)
 
-def generate_latency(time, position, handover_time):
-    """Generate realistic latency data"""
+def generate_latency(t, handover_time, rng):
+    """Generate realistic latency data for the sample times t"""
     # Latency spikes during handover
-    time_to_handover = abs(time - handover_time)
+    time_to_handover = np.abs(t - handover_time)
+    during = time_to_handover < 3
     
-    if time_to_handover < 3:
-        # High latency during handover
-        intensity = 1 - (time_to_handover / 3)
-        base = 30 + 150 * intensity
-        variation = random.uniform(-10, 10)
-    else:
-        # Low latency otherwise
-        base = 30.0
-        variation = random.uniform(-5, 5)
+    # High latency during handover, low latency otherwise; the spike term
+    # reaches zero at the edge of the window, so no branch is needed
+    base = 30 + 150 * np.maximum(0, 1 - time_to_handover / 3)
+    variation = np.where(during, 10, 5) * rng.uniform(-1, 1, len(t))
     
     # Ensure latency is within valid range
-    latency = max(10, base + variation)
-    return latency
+    return np.maximum(10, base + variation)
 
 def visualize_metrics():
     """Create visualization of streaming metrics"""
+    # Imported here so callers that only need simulate_streaming or
+    # simulate_streaming_fast never import matplotlib
+    import matplotlib
+    matplotlib.use('Agg')  # Use non-interactive backend
+    import matplotlib.pyplot as plt
+    
     info("*** Creating visualization of streaming metrics\n")
     
     try:
@@ -209,123 +257,82 @@ def visualize_metrics():
             return
         
         # Read the metrics
-        times = []
-        positions = []
-        buffers = []
-        bitrates = []
-        packet_losses = []
-        latencies = []
-        events = []
-        
         with open(metrics_file, 'r') as f:
-            next(f)  # Skip header
-            for line in f:
-                parts = line.strip().split(',')
-                if len(parts) >= 6:
-                    try:
-                        time = float(parts[0])
-                        position = float(parts[1])
-                        buffer = parts[2]
-                        bitrate = parts[3]
-                        packet_loss = parts[4]
-                        latency = parts[5]
-                        event = parts[6] if len(parts) > 6 else ""
-                        
-                        times.append(time)
-                        positions.append(position)
-                        
-                        # Parse numeric values
-                        if buffer != 'N/A':
-                            buffer = float(buffer.strip('%'))
-                        else:
-                            buffer = None
-                        buffers.append(buffer)
-                        
-                        if bitrate != 'N/A':
-                            bitrate = float(bitrate.split()[0])
-                        else:
-                            bitrate = None
-                        bitrates.append(bitrate)
-                        
-                        if packet_loss != 'N/A':
-                            packet_loss = float(packet_loss.strip('%'))
-                        else:
-                            packet_loss = None
-                        packet_losses.append(packet_loss)
-                        
-                        if latency != 'N/A':
-                            latency = float(latency.split()[0])
-                        else:
-                            latency = None
-                        latencies.append(latency)
-                        
-                        events.append(event)
-                    except Exception as e:
-                        error(f"Error parsing line: {e}\n")
+            lines = f.read().splitlines()[1:]  # Skip header
         
-        if not times:
+        if not lines:
             error("*** No valid metrics data found\n")
             return
         
+        # The value columns are plain numbers, with the N/A of event rows
+        # becoming NaN
+        data = np.genfromtxt(lines, delimiter=',', usecols=range(6),
+                             missing_values='N/A', filling_values=np.nan, ndmin=2)
+        times, positions, buffers, bitrates, packet_losses, latencies = data.T
+        codes = np.loadtxt(lines, delimiter=',', usecols=7, dtype=int, ndmin=1)
+        stall_mask = codes == EVENT_STALL
+        
+        # Distinct times of handover and playback stall events, so each
+        # marker is drawn once however many rows mention it
+        handover_times = np.unique(times[codes == EVENT_HANDOVER])
+        stall_times = np.unique(times[stall_mask])
+        
         # Create figure with 4 subplots
         fig, (ax1, ax2, ax3, ax4) = plt.subplots(4, 1, figsize=(12, 16), sharex=True)
         
         # Plot buffer status
-        buffer_times = [t for i, t in enumerate(times) if buffers[i] is not None]
-        buffer_values = [b for b in buffers if b is not None]
-        if buffer_values:
-            ax1.plot(buffer_times, buffer_values, 'b-', linewidth=2, label='Buffer Level')
+        mask = ~np.isnan(buffers)
+        if mask.any():
+            ax1.plot(times[mask], buffers[mask], 'b-', linewidth=2, label='Buffer Level')
             ax1.set_ylabel('Buffer Level (%)', fontsize=12)
             ax1.set_title('Video Buffer Level During Handover', fontsize=14, fontweight='bold')
             ax1.grid(True, alpha=0.3)
             ax1.set_ylim(0, 105)
         
         # Plot bitrate
-        bitrate_times = [t for i, t in enumerate(times) if bitrates[i] is not None]
-        bitrate_values = [b for b in bitrates if b is not None]
-        if bitrate_values:
-            ax2.plot(bitrate_times, bitrate_values, 'g-', linewidth=2, label='Video Bitrate')
+        mask = ~np.isnan(bitrates)
+        if mask.any():
+            ax2.plot(times[mask], bitrates[mask], 'g-', linewidth=2, label='Video Bitrate')
             ax2.set_ylabel('Bitrate (Mbps)', fontsize=12)
             ax2.set_title('Adaptive Bitrate During Handover', fontsize=14, fontweight='bold')
             ax2.grid(True, alpha=0.3)
-            ax2.set_ylim(0, max(bitrate_values) * 1.1)
+            ax2.set_ylim(0, np.nanmax(bitrates) * 1.1)
         
         # Plot packet loss
-        packetloss_times = [t for i, t in enumerate(times) if packet_losses[i] is not None]
-        packetloss_values = [p for p in packet_losses if p is not None]
-        if packetloss_values:
-            ax3.plot(packetloss_times, packetloss_values, 'r-', linewidth=2, label='Packet Loss')
+        mask = ~np.isnan(packet_losses)
+        if mask.any():
+            ax3.plot(times[mask], packet_losses[mask], 'r-', linewidth=2, label='Packet Loss')
             ax3.set_ylabel('Packet Loss (%)', fontsize=12)
             ax3.set_title('Network Packet Loss During Handover', fontsize=14, fontweight='bold')
             ax3.grid(True, alpha=0.3)
-            ax3.set_ylim(0, max(max(packetloss_values) * 1.1, 5))
+            ax3.set_ylim(0, max(np.nanmax(packet_losses) * 1.1, 5))
         
         # Plot latency
-        latency_times = [t for i, t in enumerate(times) if latencies[i] is not None]
-        latency_values = [l for l in latencies if l is not None]
-        if latency_values:
-            ax4.plot(latency_times, latency_values, 'm-', linewidth=2, label='Network Latency')
+        mask = ~np.isnan(latencies)
+        if mask.any():
+            ax4.plot(times[mask], latencies[mask], 'm-', linewidth=2, label='Network Latency')
             ax4.set_ylabel('Latency (ms)', fontsize=12)
             ax4.set_xlabel('Time (seconds)', fontsize=12)
             ax4.set_title('Network Latency During Handover', fontsize=14, fontweight='bold')
             ax4.grid(True, alpha=0.3)
-            ax4.set_ylim(0, max(latency_values) * 1.1)
+            ax4.set_ylim(0, np.nanmax(latencies) * 1.1)
         
-        # Mark handover events on all plots
-        for i, event in enumerate(events):
-            if event and 'handover' in event.lower():
-                for ax in (ax1, ax2, ax3, ax4):
-                    ax.axvline(x=times[i], color='red', linestyle='--', linewidth=2, label='Handover')
-                    ax.text(times[i] + 0.5, ax.get_ylim()[1] * 0.9, 'Handover', 
+        # Mark handover events on all plots, with the lines of each axis drawn
+        # as a single collection spanning its full height
+        if handover_times.size:
+            for ax in (ax1, ax2, ax3, ax4):
+                ax.vlines(handover_times, 0, 1, transform=ax.get_xaxis_transform(),
+                          colors='red', linestyles='--', linewidth=2, label='Handover')
+                for h_time in handover_times:
+                    ax.text(h_time + 0.5, ax.get_ylim()[1] * 0.9, 'Handover', 
                            rotation=90, color='red', fontweight='bold')
                     
                     # Add shaded region to represent handover impact
-                    ax.axvspan(times[i] - 1, times[i] + 3, color='red', alpha=0.1)
+                    ax.axvspan(h_time - 1, h_time + 3, color='red', alpha=0.1)
         
         # Mark stall events
-        for i, event in enumerate(events):
-            if event and 'stalled' in event.lower():
-                ax1.plot(times[i], 0, 'rx', markersize=10, label='Playback Stalled')
+        if stall_times.size:
+            ax1.plot(stall_times, np.zeros_like(stall_times), 'rx', markersize=10, label='Playback Stalled')
         
         # Add legends with unique entries
         for ax in (ax1, ax2, ax3, ax4):
@@ -333,38 +340,30 @@ def visualize_metrics():
             by_label = dict(zip(labels, handles))
             ax.legend(by_label.values(), by_label.keys(), loc='upper right')
         
-        plt.tight_layout()
-        plt.savefig('./video_streaming_handover.png', dpi=300)
+        fig.tight_layout()
+        fig.savefig('./video_streaming_handover.png', dpi=PLOT_DPI, pil_kwargs={'compress_level': 1})
+        plt.close(fig)
         info("*** Created visualization: ./video_streaming_handover.png\n")
         
         # Create a summary plot with QoE metrics
-        plt.figure(figsize=(10, 8))
-        
         # Calculate QoE metrics
-        handover_time = None
-        for i, event in enumerate(events):
-            if event and 'handover' in event.lower():
-                handover_time = times[i]
-                break
-                
+        handover_time = handover_times[0] if handover_times.size else None
+        
         if handover_time:
             # Divide data into pre-handover and post-handover
-            pre_handover_buffers = [b for i, b in enumerate(buffers) 
-                                  if b is not None and times[i] < handover_time]
-            post_handover_buffers = [b for i, b in enumerate(buffers) 
-                                   if b is not None and times[i] >= handover_time]
-            
-            pre_handover_bitrates = [b for i, b in enumerate(bitrates) 
-                                   if b is not None and times[i] < handover_time]
-            post_handover_bitrates = [b for i, b in enumerate(bitrates) 
-                                    if b is not None and times[i] >= handover_time]
+            pre_mask = times < handover_time
+            post_mask = ~pre_mask
             
             # Calculate averages
-            avg_pre_buffer = sum(pre_handover_buffers) / len(pre_handover_buffers) if pre_handover_buffers else 0
-            avg_post_buffer = sum(post_handover_buffers) / len(post_handover_buffers) if post_handover_buffers else 0
+            def masked_mean(values, mask):
+                values = values[mask]
+                return np.nanmean(values) if np.any(~np.isnan(values)) else 0
+            
+            avg_pre_buffer = masked_mean(buffers, pre_mask)
+            avg_post_buffer = masked_mean(buffers, post_mask)
             
-            avg_pre_bitrate = sum(pre_handover_bitrates) / len(pre_handover_bitrates) if pre_handover_bitrates else 0
-            avg_post_bitrate = sum(post_handover_bitrates) / len(post_handover_bitrates) if post_handover_bitrates else 0
+            avg_pre_bitrate = masked_mean(bitrates, pre_mask)
+            avg_post_bitrate = masked_mean(bitrates, post_mask)
             
             # Create bar chart comparing pre and post handover
             labels = ['Buffer Level (%)', 'Bitrate (Mbps)']
@@ -401,14 +400,15 @@ def visualize_metrics():
             buffer_impact = ((avg_post_buffer - avg_pre_buffer) / avg_pre_buffer * 100) if avg_pre_buffer else 0
             bitrate_impact = ((avg_post_bitrate - avg_pre_bitrate) / avg_pre_bitrate * 100) if avg_pre_bitrate else 0
             
-            plt.figtext(0.5, 0.01, 
+            fig.text(0.5, 0.01, 
                      f"Handover Impact Summary:\n"
                      f"Buffer Level: {buffer_impact:.1f}% change\n"
                      f"Video Bitrate: {bitrate_impact:.1f}% change\n",
                      ha='center', fontsize=12, bbox={"facecolor":"lightblue", "alpha":0.5, "pad":5})
             
-            plt.tight_layout(rect=[0, 0.08, 1, 0.95])
-            plt.savefig('./handover_impact_summary.png', dpi=300)
+            fig.tight_layout(rect=[0, 0.08, 1, 0.95])
+            fig.savefig('./handover_impact_summary.png', dpi=PLOT_DPI, pil_kwargs={'compress_level': 1})
+            plt.close(fig)
             info("*** Created summary visualization: ./handover_impact_summary.png\n")
             
             # Create a text report
@@ -424,12 +424,12 @@ def visualize_metrics():
                 f.write("BEFORE HANDOVER:\n")
                 f.write(f"- Average buffer level: {avg_pre_buffer:.1f}%\n")
                 f.write(f"- Average video bitrate: {avg_pre_bitrate:.2f} Mbps\n")
-                f.write(f"- Stall events: {sum(1 for i, e in enumerate(events) if 'stall' in e.lower() and times[i] < handover_time)}\n\n")
+                f.write(f"- Stall events: {int((stall_mask & pre_mask).sum())}\n\n")
                 
                 f.write("AFTER HANDOVER:\n")
                 f.write(f"- Average buffer level: {avg_post_buffer:.1f}%\n")
                 f.write(f"- Average video bitrate: {avg_post_bitrate:.2f} Mbps\n")
-                f.write(f"- Stall events: {sum(1 for i, e in enumerate(events) if 'stall' in e.lower() and times[i] >= handover_time)}\n\n")
+                f.write(f"- Stall events: {int((stall_mask & post_mask).sum())}\n\n")
                 
                 f.write("IMPACT ANALYSIS:\n")
                 f.write(f"- Buffer level change: {buffer_impact:.1f}%\n")
@@ -459,8 +459,11 @@ def run_simulation():
     info("\n*** Starting Video Streaming Handover Simulation\n")
     info("*** This simplified version generates realistic simulated data\n")
     
+    # FAST=1 skips the real-time session and writes the data in one batch
+    simulate = simulate_streaming_fast if os.environ.get('FAST') else simulate_streaming
+    
     info("\n*** PHASE 1: SIMULATING VIDEO STREAMING WITH HANDOVER\n")
-    if simulate_streaming():
+    if simulate():
         info("\n*** PHASE 2: VISUALIZING STREAMING METRICS\n")
         visualize_metrics()
         